@@ -16,4 +16,30 @@ user = F5 iControl User
 * sets user for F5 iControl, required.
 
 password = F5 iControl User password
-* set password for F5 iControl, required.  Must define user.
+* set password for F5 iControl, required unless credentials are stored in storage/passwords.  Must define user.
+* Credentials stored in storage/passwords with realm <device>, or realm f5query for all devices, take precedence.
+
+credential_cache_ttl = <integer>
+* seconds credentials are reused before storage/passwords is read again. 0 disables caching.
+* cached credentials, passwords included, are written in plain text to $SPLUNK_HOME/var/run/f5query/credentials.cache.
+* the file is readable by the Splunk user only, set 0 to keep passwords off disk.
+* Defaults to 300.
+
+profile_sample_rate = <float>
+* share of runs, 0 to 1, profiled as profile_sample_mode without the profile option, for example scheduled searches.
+* Defaults to 0.
+
+profile_sample_mode = cpu|memory
+* profile taken of sampled runs.
+* Defaults to cpu.
+
+profile_keep = <integer>
+* number of profiles kept in $SPLUNK_HOME/var/run/f5query/profiles, older ones are removed.
+* Defaults to 20.
+
+collector_threads = <integer>
+* number of devices the f5collector modular input polls at the same time, see inputs.conf.spec.
+* Defaults to 16.
+
+[device:<device>]
+* settings for a single device, override the [f5query] settings when the device option is <device>.
@@ -0,0 +1,32 @@
+# This file contains possible attributes and values you can use to configure f5collector inputs,
+# which poll F5 devices through iControl and index pool, pool member and virtual server events.
+#
+# Credentials of the device are read as for the f5query command, from storage/passwords or
+# the [f5query] and [device:<device>] stanzas of f5query.conf. All f5collector inputs run in a single process,
+# see collector_threads in f5query.conf.spec.
+
+[f5collector://<name>]
+device = <string>
+* IP Address or FQDN of the F5 device, required.
+
+pools = <string>
+* comma separated list of pools, all for every pool of the device.
+
+pool_only = <boolean>
+* only poll pool status, not pool members.
+* Defaults to false.
+
+vservers = <string>
+* comma separated list of virtual servers, all for every virtual server of the device.
+* Set pools, vservers or both.
+
+stats = <boolean>
+* poll pool member and virtual server statistics.
+* Defaults to false.
+
+partition = <string>
+* F5 partition made active before each poll of the input.
+
+polling_interval = <integer>
+* seconds between polls of the device. A poll still running when the next one is due skips that interval.
+* Defaults to 60.
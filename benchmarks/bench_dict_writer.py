@@ -0,0 +1,129 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compares splunk_csv.DictWriter against the per-row dict writer it replaced.
+
+Usage: python benchmarks/bench_dict_writer.py [rows]
+"""
+
+import logging
+import os
+import sys
+import time
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'bin'))
+
+from splunklib.searchcommands import splunk_csv
+from splunklib.searchcommands.search_command_internals import MessagesHeader
+
+
+class Command(object):
+    """
+    Minimal stand-in for a search command, the writer only needs messages and a logger
+    """
+    def __init__(self):
+        self.logger = logging.getLogger('bench_dict_writer')
+        self.messages = MessagesHeader()
+
+
+class LegacyDictWriter(splunk_csv.DictWriter):
+    """
+    Writer that rebuilds a row dict per record and swaps fieldnames around csv.DictWriter.writerow
+    """
+    def writerow(self, record):
+        if self.fieldnames is None:
+            self.fieldnames = record.keys()
+        self.writeheader()
+        row = {}
+        for fieldname in self.fieldnames:
+            try:
+                value = record[fieldname]
+                if isinstance(value, list):
+                    value, multi_value = self._encode_list(value)
+                    row[fieldname] = value
+                    if multi_value is not None:
+                        row['__mv_' + fieldname] = multi_value
+                elif isinstance(value, bool):
+                    row[fieldname] = int(value)
+                else:
+                    row[fieldname] = value
+            except KeyError:
+                row[fieldname] = ''
+        save_fieldnames = self.fieldnames
+        self.fieldnames = self._fieldnames
+        try:
+            return splunk_csv.csv.DictWriter.writerow(self, row)
+        finally:
+            self.fieldnames = save_fieldnames
+
+
+def records(count):
+    """
+    Yields pool member shaped records
+    :param count: number of records
+    :type count: int
+    :return: generator
+    """
+    for n in xrange(count):
+        record = {
+            '_time': 1420167900.0 + n,
+            'pool_partition': 'Common',
+            'pool_name': 'pool%d' % (n / 20),
+            'pool_member': '10.0.%d.%d' % (n / 256 % 256, n % 256),
+            'pool_member_port': 80,
+            'pool_member_availability_status': 'AVAILABILITY_STATUS_GREEN',
+            'pool_member_enabled_status': 'ENABLED_STATUS_ENABLED',
+            'source': 'f5',
+            'sourcetype': 'icontrol'}
+        for i in xrange(20):
+            record['pool_member_stat_%02d' % i] = n * i
+        if n % 50 == 0:
+            record['pool_member_tags'] = ['web', 'tier$1']
+        yield record
+
+
+def run(writer_type, rows):
+    """
+    Writes rows with writer_type
+    :param writer_type: DictWriter class
+    :type writer_type: type
+    :param rows: records to write
+    :type rows: list
+    :return: tuple of elapsed seconds and output
+    """
+    output = StringIO()
+    writer = writer_type(output, Command())
+    start = time.time()
+    for record in rows:
+        writer.writerow(record)
+    if hasattr(writer, 'flush'):
+        writer.flush()
+    return time.time() - start, output.getvalue()
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 100000
+    rows = list(records(count))
+    legacy_time, legacy_output = run(LegacyDictWriter, rows)
+    fast_time, fast_output = run(splunk_csv.DictWriter, rows)
+    assert legacy_output == fast_output, 'DictWriter output differs from legacy writer'
+    print '%-12s %10s %12s' % ('writer', 'seconds', 'rows/sec')
+    print '%-12s %10.3f %12.0f' % ('legacy', legacy_time, count / legacy_time)
+    print '%-12s %10.3f %12.0f' % ('DictWriter', fast_time, count / fast_time)
+    print 'speedup: %.2fx' % (legacy_time / fast_time)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
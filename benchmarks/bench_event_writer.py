@@ -0,0 +1,114 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures events/sec of f5collector's BatchEventWriter against splunklib's EventWriter on a /dev/null sink, after
+checking that both write the same bytes for pool member events and for events with markup, non ascii data, empty
+fields and missing time.
+
+Usage: python benchmarks/bench_event_writer.py [events]
+"""
+
+import json
+import os
+import sys
+import time
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'bin'))
+
+from splunklib.modularinput import Event, EventWriter
+from f5collector import BatchEventWriter
+
+
+def events(count):
+    """
+    Yields count pool member events as f5collector writes them
+    :param count: events
+    :type count: int
+    :return: generator
+    """
+    for n in xrange(count):
+        data = json.dumps({
+            '_time': 1420167900.0 + n,
+            'pool_partition': 'Common',
+            'pool_name': 'pool%d' % (n / 20),
+            'pool_member': '10.0.%d.%d' % (n / 256 % 256, n % 256),
+            'pool_member_port': 80,
+            'pool_member_current_connections': n % 97,
+            'pool_member_total_requests': n * 7,
+            'pool_member_availability_status': 'AVAILABILITY_STATUS_GREEN'}, separators=(',', ':'), sort_keys=True)
+        yield Event(data=data, stanza='f5collector://lb%d' % (n % 4), time='%.3f' % (1420167900.0 + n),
+                    host='lb%d.mycompany.com' % (n % 4), index='f5', source='f5', sourcetype='icontrol')
+
+
+def edge_events():
+    """
+    Returns events whose escaping or layout differs from the common case
+    :return: list
+    """
+    return [
+        Event(data='<a href="x">&amp; > "q"\n\'s\r\t</a>', stanza='f5collector://a&b "<c>"\n', time=1.5,
+              source='', sourcetype='a<b', index=None, host='h&', unbroken=False),
+        Event(data=u'caf\xe9 ☃ \U0001f600', stanza=u'st\xe4nza', host=u'h\xf6st', done=None),
+        Event(data='', stanza='empty', time='', source='s'),
+        Event(data='no stanza', time=0, done=False),
+        Event(data=u'x', stanza=None, index=u'ındex', sourcetype='st'),
+    ]
+
+
+def write(writer_class, event_list, sink):
+    """
+    Writes events and closes the writer
+    :param writer_class: EventWriter or BatchEventWriter
+    :type writer_class: type
+    :param event_list: events
+    :type event_list: list
+    :param sink: output stream
+    :type sink: file
+    :return: elapsed seconds
+    """
+    writer = writer_class(sink, StringIO())
+    start = time.time()
+    for event in event_list:
+        writer.write_event(event)
+    writer.close()
+    sink.flush()
+    return time.time() - start
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 100000
+    sample = list(events(1000)) + edge_events()
+    expected, actual = StringIO(), StringIO()
+    write(EventWriter, sample, expected)
+    write(BatchEventWriter, sample, actual)
+    if actual.getvalue() != expected.getvalue():
+        print 'BatchEventWriter output differs from EventWriter'
+        for line, (a, b) in enumerate(zip(actual.getvalue().split('</event>'), expected.getvalue().split('</event>'))):
+            if a != b:
+                print 'event %d\n  batch: %r\n  event: %r' % (line, a, b)
+                break
+        sys.exit(1)
+    print 'output of %d events identical' % len(sample)
+
+    event_list = list(events(count))
+    print '%-20s %10s %12s' % ('writer', 'seconds', 'events/sec')
+    for writer_class in (EventWriter, BatchEventWriter):
+        with open(os.devnull, 'wb') as sink:
+            elapsed = write(writer_class, event_list, sink)
+        print '%-20s %10.3f %12.0f' % (writer_class.__name__, elapsed, count / elapsed)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,70 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures importing bigsuds (and suds) from the zipped eggs against a lib directory built by bin/build_lib.py.
+
+Each import runs in a fresh interpreter. The lib directory is built in a temporary directory, so an installed
+bin/lib is neither needed nor touched.
+
+Usage: python benchmarks/bench_import.py [runs]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BIN = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'bin')
+sys.path.insert(0, BIN)
+
+import build_lib
+
+CHILD = '''
+import sys, time
+start = time.time()
+sys.path[1:1] = sys.argv[1:]
+import bigsuds
+sys.stdout.write('%f' % (time.time() - start))
+'''
+
+
+def run(paths):
+    """
+    Imports bigsuds in a fresh interpreter from paths
+    :param paths: sys.path entries holding suds and bigsuds
+    :type paths: list
+    :return: elapsed seconds
+    """
+    return float(subprocess.check_output([sys.executable, '-c', CHILD] + paths))
+
+
+def main(argv):
+    runs = int(argv[1]) if len(argv) > 1 else 10
+    eggs = build_lib.egg_paths()
+    workdir = tempfile.mkdtemp()
+    try:
+        lib = os.path.join(workdir, 'lib', 'py%d%d' % sys.version_info[:2])
+        build_lib.build(eggs, lib)
+        run([lib])  # the first import from a fresh build may still write bytecode
+        print '%-12s %14s %14s' % ('source', 'median seconds', 'min seconds')
+        for label, paths in [('eggs', eggs), ('bin/lib', [lib])]:
+            timings = sorted(run(paths) for i in xrange(runs))
+            print '%-12s %14.3f %14.3f' % (label, timings[len(timings) / 2], timings[0])
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
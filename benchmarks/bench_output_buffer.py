@@ -0,0 +1,83 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures SearchCommand.process rows/sec on a /dev/null sink with and without output buffering.
+
+Usage: python benchmarks/bench_output_buffer.py [rows]
+"""
+
+import os
+import sys
+import time
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'bin'))
+
+from splunklib.searchcommands import GeneratingCommand, Configuration, Option, validators
+
+
+@Configuration()
+class CountCommand(GeneratingCommand):
+    """
+    Generates count pool member shaped records
+    """
+    count = Option(require=True, validate=validators.Integer(0))
+
+    def generate(self):
+        for n in xrange(self.count):
+            yield {
+                '_time': 1420167900.0 + n,
+                'pool_partition': 'Common',
+                'pool_name': 'pool%d' % (n / 20),
+                'pool_member': '10.0.%d.%d' % (n / 256 % 256, n % 256),
+                'pool_member_port': 80,
+                'pool_member_current_connections': n % 97,
+                'pool_member_total_requests': n * 7,
+                'pool_member_availability_status': 'AVAILABILITY_STATUS_GREEN',
+                'source': 'f5',
+                'sourcetype': 'icontrol'}
+
+
+def run(count, buffer_size, buffering):
+    """
+    Runs CountCommand through SearchCommand.process writing to /dev/null
+    :param count: records to generate
+    :type count: int
+    :param buffer_size: SearchCommand.output_buffer_size
+    :type buffer_size: int
+    :param buffering: buffering argument for opening /dev/null
+    :type buffering: int
+    :return: elapsed seconds
+    """
+    command = CountCommand()
+    command.output_buffer_size = buffer_size
+    with open(os.devnull, 'wb', buffering) as sink:
+        start = time.time()
+        command.process(['countcommand.py', '__EXECUTE__', 'count=%d' % count], StringIO('\n'), sink)
+        return time.time() - start
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 100000
+    print '%-36s %10s %12s' % ('output', 'seconds', 'rows/sec')
+    for label, buffer_size, buffering in [
+            ('unbuffered sink, no OutputBuffer', 0, 0),
+            ('default file buffer, no OutputBuffer', 0, -1),
+            ('OutputBuffer %d bytes' % CountCommand.output_buffer_size, CountCommand.output_buffer_size, 0)]:
+        elapsed = run(count, buffer_size, buffering)
+        print '%-36s %10.3f %12.0f' % (label, elapsed, count / elapsed)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
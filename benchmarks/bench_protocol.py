@@ -0,0 +1,254 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Runs f5query.py end to end as splunkd does under the legacy protocol, against a mock_icontrol device.
+
+Every run is a fresh interpreter given __GETINFO__ or __EXECUTE__ and the search arguments on the command line and an
+InputHeader on stdin, the output messages header and CSV are read back from stdout, so dispatch,
+SearchCommand.process, F5Client, tojson and splunk_csv.DictWriter are all in the measurement. f5query.py runs from a
+copy of the app in a temporary directory with its own SPLUNK_HOME and local/f5query.conf, nothing of an installed
+Splunk or of this tree is written to.
+
+Reported per scenario are latency percentiles, rows and output bytes per second and peak RSS. --save stores them as
+the baseline, later runs fail with exit status 1 when a scenario is more than --tolerance slower, leaner in
+throughput or larger in memory than its baseline. Baselines are only comparable on the machine they were saved on and
+are not committed. Run it with Splunk's python so that splunk.clilib is importable:
+
+Usage: $SPLUNK_HOME/bin/splunk cmd python benchmarks/bench_protocol.py [--runs 10] [--pools 100] [--members 4]
+                                          [--stats 10] [--raw pretty] [--latency 0] [--save] [scenario ...]
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from cStringIO import StringIO
+from urllib import quote
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+BIN = os.path.join(os.path.dirname(BENCHMARKS), 'bin')
+sys.path.insert(0, BENCHMARKS)
+
+import mock_icontrol
+
+BASELINE = os.path.join(BENCHMARKS, 'baseline_protocol.json')
+
+# scenario -> (phase, search arguments without device)
+SCENARIOS = [
+    ('getinfo', ('__GETINFO__', ['pools=all'])),
+    ('pool_only', ('__EXECUTE__', ['pools=all', 'poolOnly=true'])),
+    ('pools', ('__EXECUTE__', ['pools=all'])),
+    ('pools_stats', ('__EXECUTE__', ['pools=all', 'stats=true'])),
+    ('vservers_stats', ('__EXECUTE__', ['vservers=all', 'stats=true'])),
+]
+
+HEADER = '''authString:<auth><userId>admin</userId><username>admin</username><authToken>%(token)s</authToken></auth>
+sessionKey:%(token)s
+owner:admin
+namespace:search
+keywords:
+search:%(search)s
+splunkVersion:6.3.0
+truncated:0
+preview:0
+realtime:0
+
+'''
+
+
+def make_app(directory):
+    """
+    Lays out an f5query app for the benchmark, f5query.py is copied so that it finds this app directory
+    :param directory: parent directory
+    :type directory: str
+    :return: tuple of f5query.py path and SPLUNK_HOME
+    """
+    app = os.path.join(directory, 'etc', 'apps', 'f5query')
+    os.makedirs(os.path.join(app, 'bin'))
+    os.makedirs(os.path.join(app, 'local'))
+    os.makedirs(os.path.join(directory, 'var', 'log', 'splunk'))
+    for name in os.listdir(BIN):
+        if name == 'f5query.py':
+            shutil.copy(os.path.join(BIN, name), os.path.join(app, 'bin', name))
+        elif not name.endswith(('.pyc', '.pyo')):
+            os.symlink(os.path.join(BIN, name), os.path.join(app, 'bin', name))
+    os.symlink(os.path.join(os.path.dirname(BIN), 'default'), os.path.join(app, 'default'))
+    with open(os.path.join(app, 'local', 'f5query.conf'), 'w') as f:
+        f.write('[f5query]\nuser = admin\npassword = admin\n')
+    return os.path.join(app, 'bin', 'f5query.py'), directory
+
+
+def run(command, phase, args, env):
+    """
+    Runs f5query.py once as splunkd would
+    :param command: f5query.py path
+    :type command: str
+    :param phase: __GETINFO__ or __EXECUTE__
+    :type phase: str
+    :param args: search arguments
+    :type args: list
+    :param env: environment of f5query.py
+    :type env: dict
+    :return: dict with seconds, rows, bytes and rss
+    """
+    search = '| f5query %s' % ' '.join(args)
+    start = time.time()
+    child = subprocess.Popen([sys.executable, command, phase] + args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             stderr=open(os.devnull, 'wb'), env=env, cwd=os.path.dirname(command))
+    child.stdin.write(HEADER % {'token': 'benchmark', 'search': quote(search)})
+    child.stdin.close()
+    output = child.stdout.read()
+    pid, status, usage = os.wait4(child.pid, 0)
+    elapsed = time.time() - start
+    child.returncode = status
+
+    messages, _, body = output.partition('\r\n\r\n') if not output.startswith('\r\n') else ('', '', output[2:])
+    records = list(csv.reader(StringIO(body)))
+    if status or (records and records[0] == ['ERROR']) or 'error_message=' in messages:
+        raise RuntimeError('%s %s failed with status %d:\n%s' % (phase, ' '.join(args), status, output[:2000]))
+    return {'seconds': elapsed, 'rows': max(len(records) - 1, 0), 'bytes': len(output),
+            'rss': usage.ru_maxrss * 1024}
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile of values, nearest rank
+    :param values: sorted values
+    :type values: list
+    :param p: percentile, 0 to 100
+    :type p: float
+    :return: float
+    """
+    return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values) + 0.5)) - 1))]
+
+
+def summarize(results):
+    """
+    Returns the measurements of a scenario from its runs
+    :param results: run results
+    :type results: list
+    :return: dict
+    """
+    seconds = sorted(result['seconds'] for result in results)
+    total = sum(seconds)
+    return {'p50': percentile(seconds, 50), 'p90': percentile(seconds, 90), 'p99': percentile(seconds, 99),
+            'rows': results[0]['rows'], 'rows_per_sec': sum(result['rows'] for result in results) / total,
+            'mb_per_sec': sum(result['bytes'] for result in results) / total / 1048576.0,
+            'rss_mb': max(result['rss'] for result in results) / 1048576.0}
+
+
+def regressions(summary, baseline, tolerance):
+    """
+    Returns descriptions of the measurements of summary that are worse than baseline by more than tolerance
+    :param summary: scenario measurements
+    :type summary: dict
+    :param baseline: scenario baseline measurements
+    :type baseline: dict
+    :param tolerance: allowed relative change, 0.2 for 20%
+    :type tolerance: float
+    :return: list
+    """
+    found = list()
+    for name, higher_is_worse in [('p50', True), ('p90', True), ('rss_mb', True), ('rows_per_sec', False)]:
+        if name not in baseline or not baseline[name]:
+            continue
+        change = summary[name] / baseline[name] - 1
+        if change > tolerance if higher_is_worse else change < -tolerance:
+            found.append('%s %.4g against %.4g (%+.0f%%)' % (name, summary[name], baseline[name], change * 100))
+    return found
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='f5query search command protocol benchmark')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured runs per scenario, they fill the caches')
+    parser.add_argument('--pools', type=int, default=100, help='pools, and virtual servers')
+    parser.add_argument('--members', type=int, default=4, help='members per pool')
+    parser.add_argument('--stats', type=int, default=10, help='statistics per member and virtual server')
+    parser.add_argument('--raw', default='pretty', choices=['false', 'compact', 'pretty'])
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the mock adds to every request')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=', '.join(name for name, scenario in SCENARIOS) + ', all by default')
+    args = parser.parse_args(argv[1:])
+    names = args.scenarios or [name for name, scenario in SCENARIOS]
+    for name in names:
+        if name not in dict(SCENARIOS):
+            parser.error('unknown scenario %s' % name)
+    config = {'pools': args.pools, 'members': args.members, 'stats': args.stats, 'raw': args.raw,
+              'latency': args.latency}
+
+    baseline = None
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config'] != config:
+            parser.error('%s was saved for %s' % (args.baseline, baseline['config']))
+
+    workdir = tempfile.mkdtemp(prefix='bench_protocol-')
+    device = mock_icontrol.SyntheticDevice(args.pools, args.members, args.pools, args.stats)
+    mock = mock_icontrol.MockICtrl(device, latency=args.latency).start()
+    try:
+        command, splunk_home = make_app(workdir)
+        env = dict(os.environ, SPLUNK_HOME=splunk_home, SSL_CERT_FILE=mock.certfile)
+
+        print '%d pools x %d members x %d statistics, raw=%s, latency=%gs, %d runs' % (
+            args.pools, args.members, args.stats, args.raw, args.latency, args.runs)
+        print '%-16s %8s %9s %9s %9s %10s %8s %9s  %s' % ('scenario', 'rows', 'p50 sec', 'p90 sec', 'p99 sec',
+                                                         'rows/sec', 'MB/sec', 'peak MB', 'regressions')
+        summaries = dict()
+        failed = False
+        for name in names:
+            phase, search_args = dict(SCENARIOS)[name]
+            search_args = search_args + ['device=%s' % mock.host]
+            if phase == '__EXECUTE__':
+                search_args.append('raw=%s' % args.raw)
+            for i in xrange(args.warmup):
+                run(command, phase, search_args, env)
+            summary = summaries[name] = summarize([run(command, phase, search_args, env)
+                                                   for i in xrange(args.runs)])
+            found = regressions(summary, baseline['scenarios'][name], args.tolerance) \
+                if baseline and name in baseline['scenarios'] else []
+            failed = failed or bool(found)
+            print '%-16s %8d %9.3f %9.3f %9.3f %10.0f %8.2f %9.1f  %s' % (
+                name, summary['rows'], summary['p50'], summary['p90'], summary['p99'], summary['rows_per_sec'],
+                summary['mb_per_sec'], summary['rss_mb'], ', '.join(found) or ('-' if baseline else 'no baseline'))
+    finally:
+        mock.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            if saved['config'] == config:
+                saved['scenarios'].update(summaries)
+                summaries = saved['scenarios']
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': config, 'scenarios': summaries}, f, indent=4, sort_keys=True)
+        print 'baseline saved to %s' % args.baseline
+    if failed:
+        print 'regressed against %s by more than %d%%' % (args.baseline, args.tolerance * 100)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,205 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compares splunklib.data.Record against the dict subclass it replaced on 10k saved search shaped entities.
+
+Entities are parsed from a synthesized Atom feed exactly as ReadOnlyCollection.iter parses them, once with
+each record type, and the Entity.content access patterns are timed on the result. Memory is reported for the record
+objects and for the distinct key strings they hold.
+
+Usage: python benchmarks/bench_record.py [entities]
+"""
+
+import gc
+import os
+import sys
+import time
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'bin'))
+
+from splunklib import client, data
+
+
+class LegacyRecord(dict):
+    """
+    The Record with an instance __dict__ and a prefix scan on every lookup
+    """
+    sep = '.'
+
+    def __call__(self, *args):
+        if len(args) == 0: return self
+        return LegacyRecord((key, self[key]) for key in args)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __delattr__(self, name):
+        del self[name]
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    @staticmethod
+    def fromkv(k, v):
+        result = data.record()
+        result[k] = v
+        return result
+
+    def __getitem__(self, key):
+        if key in self:
+            return dict.__getitem__(self, key)
+        key += self.sep
+        result = data.record()
+        for k, v in self.iteritems():
+            if not k.startswith(key):
+                continue
+            suffix = k[len(key):]
+            if '.' in suffix:
+                ks = suffix.split(self.sep)
+                z = result
+                for x in ks[:-1]:
+                    if x not in z:
+                        z[x] = data.record()
+                    z = z[x]
+                z[ks[-1]] = v
+            else:
+                result[suffix] = v
+        if len(result) == 0:
+            raise KeyError("No key or prefix: %s" % key)
+        return result
+
+
+ENTRY = (
+    '<entry><title>search%(n)d</title><id>https://localhost:8089/servicesNS/nobody/search/saved/searches/search%(n)d</id>'
+    '<link href="/servicesNS/nobody/search/saved/searches/search%(n)d" rel="alternate"/>'
+    '<link href="/servicesNS/nobody/search/saved/searches/search%(n)d" rel="edit"/>'
+    '<content type="text/xml"><s:dict>%(keys)s'
+    '<s:key name="eai:acl"><s:dict><s:key name="app">search</s:key><s:key name="owner">nobody</s:key>'
+    '<s:key name="sharing">app</s:key></s:dict></s:key>'
+    '</s:dict></content></entry>')
+
+
+def feed(count):
+    """
+    Returns an Atom feed of count saved searches
+    :param count: number of entries
+    :type count: int
+    :return: str
+    """
+    entries = []
+    for n in xrange(count):
+        keys = ['<s:key name="search">| f5query pools=* vservers=* host=lb%d</s:key>' % (n % 10)]
+        for prefix, names in [('dispatch', ['earliest_time', 'latest_time', 'ttl', 'max_count', 'lookups']),
+                              ('action.email', ['to', 'subject', 'format', 'sendresults']),
+                              ('alert', ['severity', 'suppress', 'track']),
+                              ('display.visualizations', ['show', 'type', 'charting.chart'])]:
+            for name in names:
+                keys.append('<s:key name="%s.%s">%d</s:key>' % (prefix, name, n))
+        for i in xrange(20):
+            keys.append('<s:key name="f5_field_%02d">%d</s:key>' % (i, n * i))
+        entries.append(ENTRY % {'n': n, 'keys': ''.join(keys)})
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:s="http://dev.splunk.com/ns/rest">'
+            '<title>savedsearch</title>%s</feed>' % ''.join(entries))
+
+
+def load(text, record_type):
+    """
+    Parses text into entity states with data.Record set to record_type
+    :param text: Atom feed
+    :type text: str
+    :param record_type: record class
+    :type record_type: type
+    :return: tuple of elapsed seconds, states, bytes held by record objects and by distinct key strings
+    """
+    saved = data.Record
+    data.Record = record_type
+    try:
+        gc.collect()
+        start = time.time()
+        states = [client._parse_atom_entry(entry)
+                  for entry in client._iter_atom_entries(data.record({'body': StringIO(text)}))]
+        elapsed = time.time() - start
+    finally:
+        data.Record = saved
+    gc.collect()
+    records = [o for o in gc.get_objects() if type(o) is record_type]
+    size = sum(sys.getsizeof(o) for o in records)
+    keys = dict((id(k), sys.getsizeof(k)) for o in records for k in o)
+    return elapsed, states, size, sum(keys.itervalues())
+
+
+def lookups(states):
+    """
+    Times the Entity.content access patterns over states
+    :param states: entity states
+    :type states: list
+    :return: list of tuples of pattern and seconds per lookup
+    """
+    def item():
+        for state in states:
+            state.content['search']
+
+    def attribute():
+        for state in states:
+            state.content.search
+
+    def dotted():
+        for state in states:
+            state.content['dispatch.earliest_time']
+
+    def prefix():
+        for state in states:
+            state.content.dispatch.earliest_time
+
+    def nested():
+        for state in states:
+            state.content['display.visualizations'].charting.chart
+
+    def missing():
+        for state in states:
+            'rt_backfill' in state.content and state.content.rt_backfill
+
+    timings = []
+    for name, pattern in [('content[key]', item), ('content.key', attribute), ('content[a.b]', dotted),
+                          ('content.a.b', prefix), ('content[a.b].c.d', nested), ('key in content', missing)]:
+        start = time.time()
+        for i in xrange(20):
+            pattern()
+        timings.append((name, (time.time() - start) / (20 * len(states))))
+    return timings
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 10000
+    text = feed(count)
+    legacy_parse, legacy_states, legacy_size, legacy_keys = load(text, LegacyRecord)
+    parse, states, size, keys = load(text, data.Record)
+    assert legacy_states == states, 'Record states differ from legacy states'
+    assert [s.content.dispatch for s in states] == [s.content.dispatch for s in legacy_states]
+
+    print '%-18s %12s %12s' % ('%d entities' % count, 'legacy', 'Record')
+    print '%-18s %12.3f %12.3f' % ('parse seconds', legacy_parse, parse)
+    print '%-18s %12.1f %12.1f' % ('record MB', legacy_size / 1048576.0, size / 1048576.0)
+    print '%-18s %12.1f %12.1f' % ('key MB', legacy_keys / 1048576.0, keys / 1048576.0)
+    for (name, legacy_time), (_, record_time) in zip(lookups(legacy_states), lookups(states)):
+        print '%-18s %10.2fus %10.2fus' % (name, legacy_time * 1e6, record_time * 1e6)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
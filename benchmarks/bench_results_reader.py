@@ -0,0 +1,204 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures splunklib.results throughput on a synthesized XML results file.
+
+The file is a sequence of export style XML documents, each with its own
+<?xml ...?> declaration, so the DTD filter is exercised on every document.
+The same results are also written as output_mode=json export lines and read
+with JSONResultsReader.
+
+Usage: python benchmarks/bench_results_reader.py [megabytes] [path]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'bin'))
+
+from splunklib import results
+
+
+class LegacyXMLDTDFilter(object):
+    """
+    The one character at a time filter that _XMLDTDFilter replaced
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, n=None):
+        response = ""
+        while n is None or n > 0:
+            c = self.stream.read(1)
+            if c == "":
+                break
+            elif c == "<":
+                c += self.stream.read(1)
+                if c == "<?":
+                    while True:
+                        q = self.stream.read(1)
+                        if q == ">":
+                            break
+                else:
+                    response += c
+                    if n is not None:
+                        n -= len(c)
+            else:
+                response += c
+                if n is not None:
+                    n -= 1
+        return response
+
+
+def document(n):
+    """
+    Returns one export style results document
+    :param n: document number
+    :type n: int
+    :return: str
+    """
+    fields = ''.join(
+        '<field k="pool_member_stat_%02d"><value><text>%d</text></value></field>' % (i, n * i) for i in xrange(20))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<results preview="0">\n<meta><fieldOrder><field>pool_name</field></fieldOrder></meta>\n'
+        '<result offset="%d"><field k="pool_name"><value><text>pool%d</text></value></field>'
+        '<field k="_raw"><v xml:space="preserve" trunc="0">{"pool_member": "10.0.0.%d"}</v></field>%s</result>\n'
+        '</results>\n' % (n, n / 20, n % 256, fields))
+
+
+def synthesize(path, megabytes):
+    """
+    Writes documents to path until it holds megabytes of results
+    :param path: file name
+    :type path: str
+    :param megabytes: file size
+    :type megabytes: int
+    :return: number of documents
+    """
+    size = megabytes * 1024 * 1024
+    written = 0
+    count = 0
+    with open(path, 'wb') as f:
+        while written < size:
+            text = ''.join(document(count + i) for i in xrange(1000))
+            f.write(text)
+            written += len(text)
+            count += 1000
+    return count
+
+
+def synthesize_json(path, count):
+    """
+    Writes count export style JSON result lines, the output_mode=json equivalent of synthesize
+    :param path: file name
+    :type path: str
+    :param count: number of results
+    :type count: int
+    :return: None
+    """
+    import json
+    with open(path, 'wb') as f:
+        for n in xrange(count):
+            result = dict(('pool_member_stat_%02d' % i, str(n * i)) for i in xrange(20))
+            result['pool_name'] = 'pool%d' % (n / 20)
+            result['_raw'] = '{"pool_member": "10.0.0.%d"}' % (n % 256)
+            f.write(json.dumps({'preview': False, 'offset': n, 'result': result}) + '\n')
+
+
+def drain(stream, n=16 * 1024):
+    """
+    Reads stream to end in iterparse sized reads
+    :param stream: stream to read
+    :type stream: object
+    :param n: read size
+    :type n: int
+    :return: list of str
+    """
+    chunks = []
+    while True:
+        chunk = stream.read(n)
+        if chunk == '':
+            return chunks
+        chunks.append(chunk)
+
+
+def check_equivalence():
+    """
+    Compares the block filter with the legacy filter across block boundaries
+    """
+    from StringIO import StringIO
+    import random
+    random.seed(0)
+    alphabet = ['<', '?', '>', 'a', 'b', '<?xml ', '\n']
+    for trial in xrange(2000):
+        text = ''.join(random.choice(alphabet) for i in xrange(random.randint(0, 60)))
+        if text.count('<?') and text.rfind('>') < text.rfind('<?'):
+            text += '>'  # the legacy filter never returns from an unterminated declaration
+        expected = LegacyXMLDTDFilter(StringIO(text)).read()
+        for block_size in (1, 2, 3, 7, 65536):
+            actual = ''.join(drain(results._XMLDTDFilter(StringIO(text), block_size), random.randint(1, 5)))
+            assert actual == expected, (text, block_size, actual, expected)
+
+
+def main(argv):
+    megabytes = int(argv[1]) if len(argv) > 1 else 100
+    path = argv[2] if len(argv) > 2 else os.path.join(tempfile.gettempdir(), 'bench_results_%dmb.xml' % megabytes)
+
+    check_equivalence()
+
+    if not os.path.exists(path):
+        synthesize(path, megabytes)
+    size = os.path.getsize(path) / (1024.0 * 1024.0)
+
+    print '%-28s %10s %10s' % ('reader (%.0f MB)' % size, 'seconds', 'MB/sec')
+
+    with open(path, 'rb') as f:
+        start = time.time()
+        drain(results._XMLDTDFilter(f))
+        elapsed = time.time() - start
+    print '%-28s %10.3f %10.1f' % ('_XMLDTDFilter', elapsed, size / elapsed)
+
+    # The legacy filter is measured on a slice of the file; it is far too slow for the whole of it.
+    legacy_megabytes = min(size, 5.0)
+    with open(path, 'rb') as f:
+        head = results.StringIO(f.read(int(legacy_megabytes * 1024 * 1024)))
+        start = time.time()
+        drain(LegacyXMLDTDFilter(head))
+        elapsed = time.time() - start
+    print '%-28s %10.3f %10.1f' % ('legacy filter (%.0f MB)' % legacy_megabytes, elapsed, legacy_megabytes / elapsed)
+
+    with open(path, 'rb') as f:
+        start = time.time()
+        count = sum(1 for item in results.ResultsReader(f))
+        elapsed = time.time() - start
+    print '%-28s %10.3f %10.1f  %d results, %.0f results/sec' % (
+        'ResultsReader', elapsed, size / elapsed, count, count / elapsed)
+
+    json_path = path + '.json'
+    if not os.path.exists(json_path):
+        synthesize_json(json_path, count)
+    json_size = os.path.getsize(json_path) / (1024.0 * 1024.0)
+    with open(json_path, 'rb') as f:
+        start = time.time()
+        json_count = sum(len(batch) for batch in results.JSONResultsReader(f).batches(1000))
+        elapsed = time.time() - start
+    print '%-28s %10.3f %10.1f  %d results, %.0f results/sec' % (
+        'JSONResultsReader (%.0f MB)' % json_size, elapsed, json_size / elapsed, json_count, json_count / elapsed)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,154 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures F5Client on large synthetic BIG-IP configurations for each f5query command mode.
+
+F5Client queries a mock_icontrol.LocalBIGIP, which returns the structures bigsuds would for a SyntheticDevice of the
+given size, or with --mock a mock_icontrol server through bigsuds itself. Each mode runs in a fresh interpreter so
+that its peak RSS is its own. Reported per mode:
+
+    fetch seconds   iControl calls, as generate makes them
+    first row       seconds from the end of the calls to the first record, fieldnames included
+    rows/sec        records yielded by pools_output or vserver_output per second
+    peak RSS        maximum resident memory of the run
+
+Usage: python benchmarks/bench_scale.py [--pools 1000] [--members 20] [--stats 40] [--raw pretty] [--mock]
+                                        [mode ...]
+
+10000 pools x 20 members x 40 statistics needs about 5GB for the pools_stats mode alone, the
+size of what bigsuds itself holds for such a device.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import types
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS), 'bin'))
+sys.path.insert(0, BENCHMARKS)
+
+import mock_icontrol
+
+# mode -> (pools, poolOnly, vservers, stats) as f5query options
+MODES = [
+    ('pool_only', ('all', 'true', None, None)),
+    ('pools', ('all', None, None, None)),
+    ('pools_stats', ('all', None, None, 'true')),
+    ('vservers', (None, None, 'all', None)),
+    ('vservers_stats', (None, None, 'all', 'true')),
+]
+
+
+def fetch(f5, pools, pool_only, vservers, stats):
+    """
+    Makes the F5Client calls f5QueryCommand.generate makes for a set of options, one after the other
+    :return: None
+    """
+    if vservers:
+        f5.vserver_list()
+        if stats:
+            f5.vserver_stats()
+        f5.vserver_dest()
+        f5.vserver_pool()
+    if pools:
+        f5.pool_list()
+        f5.pool_status()
+        if pool_only != 'true':
+            if stats == 'true':
+                f5.pool_member_stats()
+            f5.pool_members()
+            f5.pool_member_status()
+
+
+def run(mode, args):
+    """
+    Runs one mode in this process
+    :param mode: name in MODES
+    :type mode: str
+    :param args: parsed command line
+    :type args: Namespace
+    :return: dict of measurements
+    """
+    import f5query
+    device = mock_icontrol.SyntheticDevice(args.pools, args.members, args.pools, args.stats)
+    if args.mock:
+        mock_icontrol.allow_unverified_https()
+        mock = mock_icontrol.MockICtrl(device).start()
+        host = mock.host
+    else:
+        f5query.bigsuds = types.ModuleType('bigsuds')
+        f5query.bigsuds.BIGIP = lambda **kwargs: mock_icontrol.LocalBIGIP(device)
+        host = 'localhost'
+    pools, pool_only, vservers, stats = dict(MODES)[mode]
+    try:
+        start = time.time()
+        f5 = f5query.F5Client('admin', 'admin', host)
+        fetch(f5, pools, pool_only, vservers, stats)
+        fetched = time.time()
+        first = None
+        rows = 0
+        fieldnames = f5.pools_fieldnames(args.raw) if pools else f5.vserver_fieldnames(args.raw)
+        for record in (f5.pools_output(args.raw) if pools else f5.vserver_output(args.raw)):
+            if first is None:
+                first = time.time()
+            rows += 1
+        done = time.time()
+    finally:
+        if args.mock:
+            mock.stop()
+    return {'fetch': fetched - start, 'first': (first or done) - fetched, 'rows': rows, 'fields': len(fieldnames),
+            'output': done - fetched, 'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='F5Client scale benchmark')
+    parser.add_argument('--pools', type=int, default=1000, help='pools, and virtual servers')
+    parser.add_argument('--members', type=int, default=20, help='members per pool')
+    parser.add_argument('--stats', type=int, default=40, help='statistics per member and virtual server')
+    parser.add_argument('--raw', default='pretty', choices=['false', 'compact', 'pretty'])
+    parser.add_argument('--mock', action='store_true', help='query a mock_icontrol server through bigsuds')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('modes', nargs='*', metavar='mode',
+                        help=', '.join(name for name, options in MODES) + ', all by default')
+    args = parser.parse_args(argv[1:])
+    args.modes = args.modes or [name for name, options in MODES]
+    for mode in args.modes:
+        if mode not in dict(MODES):
+            parser.error('unknown mode %s' % mode)
+    if args.child:
+        json.dump(run(args.modes[0], args), sys.stdout)
+        return
+
+    print '%d pools x %d members x %d statistics, raw=%s%s' % (args.pools, args.members, args.stats, args.raw,
+                                                                ' through mock_icontrol' if args.mock else '')
+    print '%-16s %10s %10s %12s %10s %12s %10s' % ('mode', 'rows', 'fields', 'fetch sec', 'first row',
+                                                   'rows/sec', 'peak MB')
+    for mode in args.modes:
+        child = [sys.executable, os.path.realpath(__file__), '--child', '--pools', str(args.pools), '--members',
+                 str(args.members), '--stats', str(args.stats), '--raw', args.raw, mode]
+        if args.mock:
+            child.insert(2, '--mock')
+        result = json.loads(subprocess.check_output(child))
+        print '%-16s %10d %10d %12.3f %10.4f %12.0f %10.1f' % (
+            mode, result['rows'], result['fields'], result['fetch'], result['first'],
+            result['rows'] / result['output'] if result['output'] else 0, result['rss'] / 1048576.0)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
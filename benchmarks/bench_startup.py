@@ -0,0 +1,84 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures f5query.py startup for the __GETINFO__ and __EXECUTE__ phases of the legacy protocol.
+
+Each run is a fresh interpreter that runs bin/f5query.py as Splunk would and reports its wall time and the number of
+modules imported beyond those of the bare interpreter. The __EXECUTE__ run targets a device that refuses connections,
+so it measures startup and the first failed request rather than a query. Run it with Splunk's python so that
+splunk.clilib is importable:
+
+Usage: $SPLUNK_HOME/bin/splunk cmd python benchmarks/bench_startup.py [runs] [device]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+COMMAND = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'bin', 'f5query.py')
+
+CHILD = '''
+import json, os, runpy, sys, time
+result, argv = sys.argv[1], sys.argv[2:]
+start = time.time()
+baseline = set(sys.modules)
+sys.argv = argv
+sys.path.insert(0, os.path.dirname(argv[0]))
+try:
+    runpy.run_path(argv[0], run_name='__main__')
+except SystemExit:
+    pass
+elapsed = time.time() - start
+modules = [name for name, module in sys.modules.items() if module is not None and name not in baseline]
+with open(result, 'w') as f:
+    json.dump({'seconds': elapsed, 'modules': len(modules)}, f)
+'''
+
+
+def run(phase, device):
+    """
+    Runs f5query.py for one phase in a fresh interpreter
+    :param phase: __GETINFO__ or __EXECUTE__
+    :type phase: str
+    :param device: device option
+    :type device: str
+    :return: dict with seconds and modules
+    """
+    fd, result = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        with open(os.devnull, 'r+b') as devnull:
+            child = subprocess.Popen([sys.executable, '-c', CHILD, result, COMMAND, phase, 'device=%s' % device],
+                                     stdin=subprocess.PIPE, stdout=devnull, stderr=devnull)
+            child.communicate('\n')
+        with open(result) as f:
+            return json.load(f)
+    finally:
+        os.remove(result)
+
+
+def main(argv):
+    runs = int(argv[1]) if len(argv) > 1 else 10
+    device = argv[2] if len(argv) > 2 else '127.0.0.1'
+    print '%-12s %14s %14s %8s' % ('phase', 'median seconds', 'min seconds', 'modules')
+    for phase in ['__GETINFO__', '__EXECUTE__']:
+        results = sorted((run(phase, device) for i in xrange(runs)), key=lambda result: result['seconds'])
+        print '%-12s %14.3f %14.3f %8d' % (
+            phase, results[len(results) / 2]['seconds'], results[0]['seconds'], results[0]['modules'])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,781 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Mock BIG-IP iControl SOAP server for running F5Client and f5QueryCommand without a device.
+
+The server speaks https on /iControl/iControlPortal.cgi like a BIG-IP. It serves WSDLs for the interfaces f5query
+calls, LocalLB.Pool, LocalLB.PoolMember, LocalLB.VirtualServer and Management.Partition, answers basic auth with the
+same challenge, and encodes responses the rpc/encoded way iControl does, so bigsuds and suds run unmodified against
+it.
+
+Responses come from a device model, SyntheticDevice by default or JSONDevice for a configuration saved as json.
+LocalBIGIP returns the same structures in-process, for benchmarks that leave the SOAP round trips out. A
+recorded response can be replayed instead by saving its SOAP envelope as <recordings>/<interface>.<method>.xml, for
+example LocalLB.Pool.get_list.xml.
+
+Latency is added to every request, responses are written at a limited bandwidth and a share of the calls can be
+failed with a SOAP fault:
+
+Usage: python benchmarks/mock_icontrol.py [--port 8443] [--pools 100] [--members 4] [--vservers 100] [--stats 10]
+                                          [--model device.json] [--recordings dir] [--latency 0.02]
+                                          [--bandwidth 1000000] [--error-rate 0.01]
+
+The server uses a self-signed certificate, clients in other processes trust it with SSL_CERT_FILE set to
+MockICtrl.certfile, benchmark processes can call allow_unverified_https() instead.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from base64 import b64decode
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+try:
+    import xml.etree.cElementTree as et
+except ImportError:
+    import xml.etree.ElementTree as et
+
+# region iControl types
+
+# Every type f5query sends or receives, as iControl names them. Arrays name their item type, structs their fields.
+TYPES = {
+    'Common.StringSequence': ('array', 'xsd:string'),
+    'Common.ULong64': ('struct', [('high', 'xsd:unsignedInt'), ('low', 'xsd:unsignedInt')]),
+    'Common.TimeStamp': ('struct', [('year', 'xsd:long'), ('month', 'xsd:long'), ('day', 'xsd:long'),
+                                    ('hour', 'xsd:long'), ('minute', 'xsd:long'), ('second', 'xsd:long')]),
+    'Common.Statistic': ('struct', [('type', 'xsd:string'), ('value', 'Common.ULong64'), ('time_stamp', 'xsd:long')]),
+    'Common.StatisticSequence': ('array', 'Common.Statistic'),
+    'Common.AddressPort': ('struct', [('address', 'xsd:string'), ('port', 'xsd:long')]),
+    'Common.AddressPortSequence': ('array', 'Common.AddressPort'),
+    'Common.AddressPortSequenceSequence': ('array', 'Common.AddressPortSequence'),
+    'Common.IPPortDefinition': ('struct', [('address', 'xsd:string'), ('port', 'xsd:long')]),
+    'Common.VirtualServerDefinition': ('struct', [('name', 'xsd:string'), ('address', 'xsd:string'),
+                                                  ('port', 'xsd:long'), ('protocol', 'xsd:string')]),
+    'LocalLB.ObjectStatus': ('struct', [('availability_status', 'xsd:string'), ('enabled_status', 'xsd:string'),
+                                        ('status_description', 'xsd:string')]),
+    'LocalLB.ObjectStatusSequence': ('array', 'LocalLB.ObjectStatus'),
+    'LocalLB.PoolMember.MemberObjectStatus': ('struct', [('member', 'Common.IPPortDefinition'),
+                                                         ('object_status', 'LocalLB.ObjectStatus')]),
+    'LocalLB.PoolMember.MemberObjectStatusSequence': ('array', 'LocalLB.PoolMember.MemberObjectStatus'),
+    'LocalLB.PoolMember.MemberObjectStatusSequenceSequence': ('array',
+                                                              'LocalLB.PoolMember.MemberObjectStatusSequence'),
+    'LocalLB.Pool.PoolMemberStatisticEntry': ('struct', [('member', 'Common.AddressPort'),
+                                                         ('statistics', 'Common.StatisticSequence')]),
+    'LocalLB.Pool.PoolMemberStatisticEntrySequence': ('array', 'LocalLB.Pool.PoolMemberStatisticEntry'),
+    'LocalLB.Pool.PoolMemberStatistics': ('struct', [('statistics', 'LocalLB.Pool.PoolMemberStatisticEntrySequence'),
+                                                     ('time_stamp', 'Common.TimeStamp')]),
+    'LocalLB.Pool.PoolMemberStatisticsSequence': ('array', 'LocalLB.Pool.PoolMemberStatistics'),
+    'LocalLB.VirtualServer.VirtualServerStatisticEntry': ('struct', [
+        ('virtual_server', 'Common.VirtualServerDefinition'), ('statistics', 'Common.StatisticSequence')]),
+    'LocalLB.VirtualServer.VirtualServerStatisticEntrySequence': (
+        'array', 'LocalLB.VirtualServer.VirtualServerStatisticEntry'),
+    'LocalLB.VirtualServer.VirtualServerStatistics': ('struct', [
+        ('statistics', 'LocalLB.VirtualServer.VirtualServerStatisticEntrySequence'),
+        ('time_stamp', 'Common.TimeStamp')]),
+}
+
+# interface -> method -> (parameters, return type)
+INTERFACES = {
+    'LocalLB.Pool': {
+        'get_list': ([], 'Common.StringSequence'),
+        'get_object_status': ([('pool_names', 'Common.StringSequence')], 'LocalLB.ObjectStatusSequence'),
+        'get_member_v2': ([('pool_names', 'Common.StringSequence')], 'Common.AddressPortSequenceSequence'),
+        'get_all_member_statistics': ([('pool_names', 'Common.StringSequence')],
+                                      'LocalLB.Pool.PoolMemberStatisticsSequence'),
+    },
+    'LocalLB.PoolMember': {
+        'get_object_status': ([('pool_names', 'Common.StringSequence')],
+                              'LocalLB.PoolMember.MemberObjectStatusSequenceSequence'),
+    },
+    'LocalLB.VirtualServer': {
+        'get_list': ([], 'Common.StringSequence'),
+        'get_destination_v2': ([('virtual_servers', 'Common.StringSequence')], 'Common.AddressPortSequence'),
+        'get_default_pool_name': ([('virtual_servers', 'Common.StringSequence')], 'Common.StringSequence'),
+        'get_statistics': ([('virtual_servers', 'Common.StringSequence')],
+                           'LocalLB.VirtualServer.VirtualServerStatistics'),
+    },
+    'Management.Partition': {
+        'get_active_partition': ([], 'xsd:string'),
+        'set_active_partition': ([('active_partition', 'xsd:string')], None),
+    },
+}
+
+# endregion
+
+# region Device models
+
+
+def _stat_types(prefix, count):
+    """
+    Returns count iControl statistic type names
+    :param prefix: STATISTIC_SERVER_SIDE or STATISTIC_CLIENT_SIDE
+    :type prefix: str
+    :param count: number of names
+    :type count: int
+    :return: list
+    """
+    names = ['%s_%s' % (prefix, name) for name in [
+        'BYTES_IN', 'BYTES_OUT', 'PACKETS_IN', 'PACKETS_OUT', 'CURRENT_CONNECTIONS', 'MAXIMUM_CONNECTIONS',
+        'TOTAL_CONNECTIONS']]
+    names.extend(['STATISTIC_TOTAL_REQUESTS', 'STATISTIC_CURRENT_SESSIONS', 'STATISTIC_CONNQUEUE_DEPTH',
+                  'STATISTIC_CONNQUEUE_AGE_OLDEST_ENTRY', 'STATISTIC_CONNQUEUE_AGE_MAX',
+                  'STATISTIC_CONNQUEUE_AGE_MOVING_AVG', 'STATISTIC_CONNQUEUE_SERVICED',
+                  'STATISTIC_CONNQUEUE_AGE_EXPONENTIAL_DECAY_MAX', 'STATISTIC_PVA_SERVER_SIDE_BYTES_IN',
+                  'STATISTIC_PVA_SERVER_SIDE_BYTES_OUT', 'STATISTIC_PVA_SERVER_SIDE_CURRENT_CONNECTIONS',
+                  'STATISTIC_TOTAL_PVA_ASSISTED_CONNECTIONS', 'STATISTIC_CURRENT_PVA_ASSISTED_CONNECTIONS'])
+    n = 0
+    while len(names) < count:
+        names.append('STATISTIC_MOCK_COUNTER_%02d' % n)
+        n += 1
+    return names[:count]
+
+
+class SyntheticDevice(object):
+    """
+    A BIG-IP configuration computed on demand, so that large ones cost no memory
+
+    Pools are /<partition>/pool_<n> with members 10.<n>.<m>:80, virtual servers /<partition>/vs_<n> use pool_<n>.
+    Statistics grow with time so that consecutive polls differ.
+    """
+    def __init__(self, pools=100, members=4, vservers=100, stats=10, partitions=('Common',), seed=0):
+        self.pools = pools
+        self.members = members
+        self.vservers = vservers
+        self.partitions = list(partitions)
+        self.pool_stat_types = _stat_types('STATISTIC_SERVER_SIDE', stats)
+        self.vserver_stat_types = _stat_types('STATISTIC_CLIENT_SIDE', stats)
+        self.seed = seed
+        self.started = time.time()
+
+    def _pool_index(self, name):
+        return int(name.rsplit('_', 1)[1])
+
+    def _counter(self, *key):
+        # Grows by up to 1000 a second from a value fixed by seed and key, and crosses 2**32 now and then
+        base = hash((self.seed,) + key) & 0xffffffffff
+        return base + int((time.time() - self.started) * (hash(key) % 1000))
+
+    def pool_list(self):
+        return ['/%s/pool_%d' % (self.partitions[n % len(self.partitions)], n) for n in xrange(self.pools)]
+
+    def pool_status(self, pool):
+        n = self._pool_index(pool)
+        return ('AVAILABILITY_STATUS_RED' if n % 50 == 49 else 'AVAILABILITY_STATUS_GREEN',
+                'ENABLED_STATUS_ENABLED')
+
+    def pool_members(self, pool):
+        n = self._pool_index(pool)
+        partition = pool.strip('/').split('/')[0]
+        return [('/%s/10.%d.%d.%d' % (partition, n / 256 % 256, n % 256, m), 80) for m in xrange(self.members)]
+
+    def member_status(self, pool, member):
+        n = self._pool_index(pool)
+        return ('AVAILABILITY_STATUS_RED' if n % 50 == 49 else 'AVAILABILITY_STATUS_GREEN',
+                'ENABLED_STATUS_ENABLED')
+
+    def member_statistics(self, pool, member):
+        return [(name, self._counter(pool, member[0], name)) for name in self.pool_stat_types]
+
+    def vserver_list(self):
+        return ['/%s/vs_%d' % (self.partitions[n % len(self.partitions)], n) for n in xrange(self.vservers)]
+
+    def vserver_destination(self, vserver):
+        n = self._pool_index(vserver)
+        partition = vserver.strip('/').split('/')[0]
+        return '/%s/172.%d.%d.%d' % (partition, 16 + n / 65536 % 16, n / 256 % 256, n % 256), 443
+
+    def vserver_pool(self, vserver):
+        n = self._pool_index(vserver)
+        if n >= self.pools or n % 10 == 9:
+            return ''
+        return '/%s/pool_%d' % (self.partitions[n % len(self.partitions)], n)
+
+    def vserver_protocol(self, vserver):
+        return 'PROTOCOL_TCP'
+
+    def vserver_statistics(self, vserver):
+        return [(name, self._counter(vserver, name)) for name in self.vserver_stat_types]
+
+
+class JSONDevice(object):
+    """
+    A BIG-IP configuration read from json
+
+    {"pools": [{"name": "/Common/web", "availability_status": ..., "enabled_status": ...,
+                "members": [{"address": "/Common/10.0.0.1", "port": 80, "availability_status": ...,
+                             "enabled_status": ..., "statistics": {"STATISTIC_TOTAL_REQUESTS": 7, ...}}]}],
+     "virtual_servers": [{"name": "/Common/web_vs", "address": "/Common/10.1.0.1", "port": 443,
+                          "protocol": "PROTOCOL_TCP", "pool": "/Common/web", "statistics": {...}}]}
+    """
+    def __init__(self, path):
+        with open(path) as f:
+            config = json.load(f)
+        self._pools = dict((pool['name'], pool) for pool in config.get('pools', []))
+        self._pool_names = [pool['name'] for pool in config.get('pools', [])]
+        self._vservers = dict((vserver['name'], vserver) for vserver in config.get('virtual_servers', []))
+        self._vserver_names = [vserver['name'] for vserver in config.get('virtual_servers', [])]
+
+    def _member(self, pool, member):
+        for candidate in self._pools[pool].get('members', []):
+            if candidate['address'] == member[0] and candidate['port'] == member[1]:
+                return candidate
+        return {}
+
+    def pool_list(self):
+        return self._pool_names
+
+    def pool_status(self, pool):
+        pool = self._pools[pool]
+        return (pool.get('availability_status', 'AVAILABILITY_STATUS_GREEN'),
+                pool.get('enabled_status', 'ENABLED_STATUS_ENABLED'))
+
+    def pool_members(self, pool):
+        return [(member['address'], member['port']) for member in self._pools[pool].get('members', [])]
+
+    def member_status(self, pool, member):
+        member = self._member(pool, member)
+        return (member.get('availability_status', 'AVAILABILITY_STATUS_GREEN'),
+                member.get('enabled_status', 'ENABLED_STATUS_ENABLED'))
+
+    def member_statistics(self, pool, member):
+        return sorted(self._member(pool, member).get('statistics', {}).items())
+
+    def vserver_list(self):
+        return self._vserver_names
+
+    def vserver_destination(self, vserver):
+        return self._vservers[vserver]['address'], self._vservers[vserver]['port']
+
+    def vserver_pool(self, vserver):
+        return self._vservers[vserver].get('pool', '')
+
+    def vserver_protocol(self, vserver):
+        return self._vservers[vserver].get('protocol', 'PROTOCOL_TCP')
+
+    def vserver_statistics(self, vserver):
+        return sorted(self._vservers[vserver].get('statistics', {}).items())
+
+
+def _timestamp():
+    now = time.gmtime()
+    return {'year': now.tm_year, 'month': now.tm_mon, 'day': now.tm_mday, 'hour': now.tm_hour,
+            'minute': now.tm_min, 'second': now.tm_sec}
+
+
+def _ulong64(value):
+    return {'high': value >> 32 & 0xffffffff, 'low': value & 0xffffffff}
+
+
+class Handlers(object):
+    """
+    Computes the return value of each iControl method from a device model
+    """
+    def __init__(self, device):
+        self.device = device
+        self.partition = 'Common'
+
+    def call(self, interface, method, args):
+        if interface == 'LocalLB.Pool':
+            if method == 'get_list':
+                return self.device.pool_list()
+            pools = args['pool_names']
+            if method == 'get_object_status':
+                return [dict(zip(('availability_status', 'enabled_status'), self.device.pool_status(pool)),
+                             status_description='') for pool in pools]
+            if method == 'get_member_v2':
+                return [[{'address': address, 'port': port} for address, port in self.device.pool_members(pool)]
+                        for pool in pools]
+            if method == 'get_all_member_statistics':
+                timestamp = _timestamp()
+                return [{'statistics': [{'member': {'address': member[0], 'port': member[1]},
+                                         'statistics': [{'type': name, 'value': _ulong64(value), 'time_stamp': 0}
+                                                        for name, value in
+                                                        self.device.member_statistics(pool, member)]}
+                                        for member in self.device.pool_members(pool)],
+                         'time_stamp': timestamp} for pool in pools]
+        elif interface == 'LocalLB.PoolMember' and method == 'get_object_status':
+            pools = args['pool_names']
+            return [[{'member': {'address': member[0].rsplit('/', 1)[-1], 'port': member[1]},
+                      'object_status': dict(zip(('availability_status', 'enabled_status'),
+                                                self.device.member_status(pool, member)), status_description='')}
+                     for member in self.device.pool_members(pool)] for pool in pools]
+        elif interface == 'LocalLB.VirtualServer':
+            if method == 'get_list':
+                return self.device.vserver_list()
+            vservers = args['virtual_servers']
+            if method == 'get_destination_v2':
+                return [dict(zip(('address', 'port'), self.device.vserver_destination(vserver)))
+                        for vserver in vservers]
+            if method == 'get_default_pool_name':
+                return [self.device.vserver_pool(vserver) for vserver in vservers]
+            if method == 'get_statistics':
+                return {'statistics': [
+                    {'virtual_server': {'name': vserver,
+                                        'address': self.device.vserver_destination(vserver)[0],
+                                        'port': self.device.vserver_destination(vserver)[1],
+                                        'protocol': self.device.vserver_protocol(vserver)},
+                     'statistics': [{'type': name, 'value': _ulong64(value), 'time_stamp': 0}
+                                    for name, value in self.device.vserver_statistics(vserver)]}
+                    for vserver in vservers], 'time_stamp': _timestamp()}
+        elif interface == 'Management.Partition':
+            if method == 'get_active_partition':
+                return self.partition
+            if method == 'set_active_partition':
+                self.partition = args['active_partition']
+                return None
+        raise NotImplementedError('%s.%s' % (interface, method))
+
+
+class LocalBIGIP(object):
+    """
+    Stands in for bigsuds.BIGIP, returning the structures bigsuds builds from the mock's responses without SOAP
+
+        f5 = LocalBIGIP(SyntheticDevice(pools=10000, members=20, stats=40))
+        f5.LocalLB.Pool.get_member_v2(f5.LocalLB.Pool.get_list())
+    """
+    def __init__(self, device, namespace=None, handlers=None):
+        self._handlers = handlers or Handlers(device)
+        self._namespace = namespace
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._namespace is None:
+            return LocalBIGIP(None, name, self._handlers)
+        interface = '%s.%s' % (self._namespace, name)
+        if interface not in INTERFACES:
+            raise AttributeError(interface)
+        return _LocalInterface(self._handlers, interface)
+
+
+class _LocalInterface(object):
+
+    def __init__(self, handlers, interface):
+        self._handlers = handlers
+        self._interface = interface
+
+    def __getattr__(self, method):
+        if method not in INTERFACES[self._interface]:
+            raise AttributeError('%s.%s' % (self._interface, method))
+        parameters = [name for name, type_name in INTERFACES[self._interface][method][0]]
+
+        def call(*args, **kwargs):
+            kwargs.update(zip(parameters, args))
+            return self._handlers.call(self._interface, method, kwargs)
+        return call
+
+# endregion
+
+# region SOAP encoding
+
+NAMESPACES = (
+    'xmlns:E="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:A="http://schemas.xmlsoap.org/soap/encoding/" '
+    'xmlns:s="http://www.w3.org/2001/XMLSchema-instance" '
+    'xmlns:y="http://www.w3.org/2001/XMLSchema" '
+    'xmlns:iControl="urn:iControl"')
+
+
+def _xsi_type(type_name):
+    return type_name.replace('xsd:', 'y:') if type_name.startswith('xsd:') else 'iControl:' + type_name
+
+
+def _array_type(type_name, length):
+    # iControl writes nested arrays as item[][n]
+    kind, item = TYPES[type_name]
+    dimensions = ''
+    while not item.startswith('xsd:') and TYPES[item][0] == 'array':
+        item = TYPES[item][1]
+        dimensions += '[]'
+    return '%s%s[%d]' % (_xsi_type(item), dimensions, length)
+
+
+def encode(name, type_name, value, out):
+    """
+    Appends the rpc/encoded xml of a value to out
+    :param name: element name
+    :type name: str
+    :param type_name: iControl or xsd type name
+    :type type_name: str
+    :param value: value of the type
+    :type value: object
+    :param out: list of str
+    :type out: list
+    :return: None
+    """
+    if type_name.startswith('xsd:'):
+        text = escape(value) if isinstance(value, basestring) else str(value)
+        out.append('<%s s:type="%s">%s</%s>' % (name, _xsi_type(type_name), text, name))
+        return
+    kind, spec = TYPES[type_name]
+    if kind == 'array':
+        out.append('<%s s:type="A:Array" A:arrayType="%s">' % (name, _array_type(type_name, len(value))))
+        for item in value:
+            encode('item', spec, item, out)
+    else:
+        out.append('<%s s:type="%s">' % (name, _xsi_type(type_name)))
+        for field, field_type in spec:
+            encode(field, field_type, value[field], out)
+    out.append('</%s>' % name)
+
+
+def envelope(interface, method, return_type, value):
+    """
+    Returns the SOAP response envelope for a method
+    :param interface: iControl interface, LocalLB.Pool
+    :type interface: str
+    :param method: method name
+    :type method: str
+    :param return_type: type of value or None for void methods
+    :type return_type: str
+    :param value: return value
+    :type value: object
+    :return: str
+    """
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n<E:Envelope %s '
+           'E:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><E:Body>'
+           '<m:%sResponse xmlns:m="urn:iControl:%s">' % (NAMESPACES, method, interface.replace('.', '/'))]
+    if return_type is not None:
+        encode('return', return_type, value, out)
+    out.append('</m:%sResponse></E:Body></E:Envelope>' % method)
+    return ''.join(out)
+
+
+def fault(message):
+    """
+    Returns a SOAP fault envelope as a BIG-IP sends for a failed call
+    :param message: fault string
+    :type message: str
+    :return: str
+    """
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<E:Envelope %s><E:Body><E:Fault>'
+            '<faultcode>E:Server</faultcode><faultstring>%s</faultstring>'
+            '</E:Fault></E:Body></E:Envelope>' % (NAMESPACES, escape(message)))
+
+
+def decode(element, type_name):
+    """
+    Returns the python value of an rpc/encoded request argument
+    suds names array items after the part, pool_names holds <items>, so arrays are read by type rather than by name.
+    :param element: argument element
+    :type element: Element
+    :param type_name: iControl or xsd type name
+    :type type_name: str
+    :return: object
+    """
+    if type_name.startswith('xsd:'):
+        return element.text or ''
+    kind, spec = TYPES[type_name]
+    if kind == 'array':
+        return [decode(child, spec) for child in element]
+    children = dict((child.tag.rsplit('}', 1)[-1], child) for child in element)
+    return dict((field, decode(children[field], field_type)) for field, field_type in spec if field in children)
+
+
+def wsdl(interface):
+    """
+    Returns the WSDL of an iControl interface, covering the methods in INTERFACES
+    :param interface: iControl interface, LocalLB.Pool
+    :type interface: str
+    :return: str
+    """
+    def reference(type_name):
+        return type_name if type_name.startswith('xsd:') else 'tns:' + type_name
+
+    urn = 'urn:iControl:%s' % interface.replace('.', '/')
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<definitions name="%s" targetNamespace="urn:iControl" xmlns:tns="urn:iControl" '
+           'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+           'xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" '
+           'xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" '
+           'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" xmlns="http://schemas.xmlsoap.org/wsdl/">'
+           '<types><xsd:schema targetNamespace="urn:iControl">'
+           '<xsd:import namespace="http://schemas.xmlsoap.org/soap/encoding/"/>' % interface]
+    for type_name in sorted(TYPES):
+        kind, spec = TYPES[type_name]
+        if kind == 'array':
+            out.append('<xsd:complexType name="%s"><xsd:complexContent><xsd:restriction base="SOAP-ENC:Array">'
+                       '<xsd:attribute ref="SOAP-ENC:arrayType" wsdl:arrayType="%s[]"/>'
+                       '</xsd:restriction></xsd:complexContent></xsd:complexType>' % (type_name, reference(spec)))
+        else:
+            out.append('<xsd:complexType name="%s"><xsd:all>' % type_name)
+            for field, field_type in spec:
+                out.append('<xsd:element name="%s" type="%s"/>' % (field, reference(field_type)))
+            out.append('</xsd:all></xsd:complexType>')
+    out.append('</xsd:schema></types>')
+    methods = sorted(INTERFACES[interface].items())
+    for method, (parameters, return_type) in methods:
+        out.append('<message name="%s.%sRequest">' % (interface, method))
+        for parameter, parameter_type in parameters:
+            out.append('<part name="%s" type="%s"/>' % (parameter, reference(parameter_type)))
+        out.append('</message><message name="%s.%sResponse">' % (interface, method))
+        if return_type is not None:
+            out.append('<part name="return" type="%s"/>' % reference(return_type))
+        out.append('</message>')
+    out.append('<portType name="%s.PortType">' % interface)
+    for method, _ in methods:
+        out.append('<operation name="%s"><input message="tns:%s.%sRequest"/>'
+                   '<output message="tns:%s.%sResponse"/></operation>' % (method, interface, method, interface, method))
+    out.append('</portType><binding name="%s.Binding" type="tns:%s.PortType">'
+               '<soap:binding style="rpc" transport="http://schemas.xmlsoap.org/soap/http"/>' % (interface, interface))
+    body = ('<soap:body use="encoded" namespace="%s" '
+            'encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"/>' % urn)
+    for method, _ in methods:
+        out.append('<operation name="%s"><soap:operation soapAction="%s"/><input>%s</input><output>%s</output>'
+                   '</operation>' % (method, urn, body, body))
+    out.append('</binding><service name="%s"><port name="%s.Port" binding="tns:%s.Binding">'
+               '<soap:address location="https://url_to_service"/></port></service></definitions>'
+               % (interface, interface, interface))
+    return ''.join(out)
+
+# endregion
+
+# region Server
+
+
+class ICtrlRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves /iControl/iControlPortal.cgi, WSDLs on GET and method calls on POST
+    """
+    server_version = 'mock-icontrol/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _authorized(self):
+        header = self.headers.getheader('Authorization')
+        if header and header.startswith('Basic '):
+            user, _, password = b64decode(header[6:]).partition(':')
+            if (user, password) == (self.server.username, self.server.password):
+                return True
+        self.send_response(401)
+        self.send_header('WWW-Authenticate', 'Basic realm="BIG-IP"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return False
+
+    def _reply(self, status, body, content_type='text/xml; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        chunk = max(1024, int(bandwidth / 50))
+        for offset in xrange(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            time.sleep(len(body[offset:offset + chunk]) / float(bandwidth))
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if not self._authorized():
+            return
+        url = urlsplit(self.path)
+        interface = parse_qs(url.query).get('WSDL', [None])[0]
+        if url.path != '/iControl/iControlPortal.cgi' or interface not in INTERFACES:
+            self._reply(404, 'No such WSDL', 'text/plain')
+            return
+        self._reply(200, self.server.wsdl(interface))
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        request = self.rfile.read(int(self.headers.getheader('Content-Length', 0)))
+        if not self._authorized():
+            return
+        self.server.count('requests')
+        try:
+            body = et.fromstring(request).find('{http://schemas.xmlsoap.org/soap/envelope/}Body')
+            call = list(body)[0]
+            namespace, method = call.tag[1:].split('}')
+            interface = namespace.split(':', 2)[2].replace('/', '.')
+            parameters, return_type = INTERFACES[interface][method]
+            arguments = dict((argument.tag.rsplit('}', 1)[-1], argument) for argument in call)
+            args = dict((name, decode(arguments[name], type_name)) for name, type_name in parameters
+                        if name in arguments)
+        except Exception as e:
+            self._reply(500, fault('Unable to parse request: %s' % e))
+            return
+        if random.random() < self.server.error_rate:
+            self.server.count('errors')
+            self._reply(500, fault('Exception caught in %s::%s()\nprimary_error_code : 16908342 (0x01020036)\n'
+                                   'error_string : mock error injection' % (interface, method)))
+            return
+        recording = self.server.recording(interface, method)
+        if recording is not None:
+            self._reply(200, recording)
+            return
+        try:
+            value = self.server.handlers.call(interface, method, args)
+        except (LookupError, NotImplementedError, ValueError) as e:
+            self._reply(500, fault('Exception caught in %s::%s()\n%s' % (interface, method, e)))
+            return
+        self._reply(200, envelope(interface, method, return_type, value))
+
+
+class MockICtrlServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded https server for ICtrlRequestHandler
+    """
+    daemon_threads = True
+
+    def __init__(self, address, device, certfile, keyfile, username='admin', password='admin', latency=0.0,
+                 bandwidth=None, error_rate=0.0, recordings=None, verbose=False):
+        HTTPServer.__init__(self, address, ICtrlRequestHandler)
+        self.socket = ssl.wrap_socket(self.socket, certfile=certfile, keyfile=keyfile, server_side=True)
+        self.handlers = Handlers(device)
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.recordings = recordings
+        self.verbose = verbose
+        self.counters = {'requests': 0, 'errors': 0}
+        self._wsdls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def recording(self, interface, method):
+        if self.recordings is None:
+            return None
+        path = os.path.join(self.recordings, '%s.%s.xml' % (interface, method))
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def wsdl(self, interface):
+        if interface not in self._wsdls:
+            self._wsdls[interface] = wsdl(interface)
+        return self._wsdls[interface]
+
+
+def self_signed_certificate(directory):
+    """
+    Creates a self-signed certificate for localhost with openssl
+    Child processes trust it when SSL_CERT_FILE names it, python 2 matches host names only, never addresses.
+    :param directory: directory for the certificate and key
+    :type directory: str
+    :return: tuple of certificate and key file names
+    """
+    certfile = os.path.join(directory, 'mock_icontrol.crt')
+    keyfile = os.path.join(directory, 'mock_icontrol.key')
+    command = ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '2', '-subj', '/CN=localhost',
+               '-keyout', keyfile, '-out', certfile]
+    with open(os.devnull, 'wb') as devnull:
+        subprocess.check_call(command, stdout=devnull, stderr=devnull)
+    return certfile, keyfile
+
+
+def allow_unverified_https():
+    """
+    Turns off certificate verification for https clients of this process, python 2.7.9 and later verify by default
+    Only for benchmark processes talking to the mock, never for f5query itself.
+    :return: None
+    """
+    if hasattr(ssl, '_create_unverified_context'):
+        ssl._create_default_https_context = ssl._create_unverified_context
+
+
+class MockICtrl(object):
+    """
+    Runs a MockICtrlServer on a background thread
+
+        with MockICtrl(SyntheticDevice(pools=10)) as mock:
+            f5 = F5Client('admin', 'admin', mock.host)
+    """
+    def __init__(self, device=None, port=0, **kwargs):
+        self._directory = tempfile.mkdtemp(prefix='mock_icontrol-')
+        self.certfile, keyfile = self_signed_certificate(self._directory)
+        self.server = MockICtrlServer(('127.0.0.1', port), device or SyntheticDevice(), self.certfile, keyfile,
+                                      **kwargs)
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+
+    @property
+    def host(self):
+        return 'localhost:%d' % self.server.port
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+# endregion
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Mock BIG-IP iControl SOAP server')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--pools', type=int, default=100)
+    parser.add_argument('--members', type=int, default=4)
+    parser.add_argument('--vservers', type=int, default=100)
+    parser.add_argument('--stats', type=int, default=10, help='statistics per pool member and virtual server')
+    parser.add_argument('--model', help='json device configuration, replaces the synthetic one')
+    parser.add_argument('--recordings', help='directory of <interface>.<method>.xml responses to replay')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--bandwidth', type=float, default=None, help='response bytes per second')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered with a fault')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv[1:])
+    device = JSONDevice(args.model) if args.model else SyntheticDevice(args.pools, args.members, args.vservers,
+                                                                       args.stats)
+    mock = MockICtrl(device, args.port, username=args.username, password=args.password, latency=args.latency,
+                     bandwidth=args.bandwidth, error_rate=args.error_rate, recordings=args.recordings,
+                     verbose=args.verbose)
+    print 'mock iControl on https://%s/iControl/iControlPortal.cgi' % mock.host
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+        shutil.rmtree(mock._directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,90 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Unpacks the eggs in bin/eggs into bin/lib/py<major><minor> and byte-compiles them for the running python.
+
+f5query.py imports suds and bigsuds from that directory when it exists, instead of through zipimport from eggs
+whose bytecode was compiled for another python version. Run it with Splunk's python after installing or upgrading
+the app, or upgrading Splunk:
+
+Usage: $SPLUNK_HOME/bin/splunk cmd python $SPLUNK_HOME/etc/apps/f5query/bin/build_lib.py
+"""
+
+import compileall
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from f5query import egg_paths, lib_dir
+
+
+def unpack(egg, target):
+    """
+    Extracts the python sources of an egg, leaving out its metadata and bytecode
+    :param egg: egg file name
+    :type egg: str
+    :param target: directory to extract to
+    :type target: str
+    :return: number of files extracted
+    """
+    count = 0
+    with zipfile.ZipFile(egg) as archive:
+        for name in archive.namelist():
+            if name.startswith('EGG-INFO/') or name.endswith(('.pyc', '.pyo', '/')):
+                continue
+            archive.extract(name, target)
+            count += 1
+    return count
+
+
+def build(eggs, target):
+    """
+    Unpacks and byte-compiles eggs into target, replacing it as a whole so f5query never sees a partial build
+    :param eggs: egg file names
+    :type eggs: list
+    :param target: lib directory
+    :type target: str
+    :return: None
+    """
+    parent = os.path.dirname(target)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    staging = tempfile.mkdtemp(prefix='.build-', dir=parent)
+    try:
+        for egg in eggs:
+            print '%s: %d files' % (os.path.basename(egg), unpack(egg, staging))
+        if not compileall.compile_dir(staging, quiet=1, force=True):
+            raise SystemExit('byte-compiling %s failed' % staging)
+        with open(os.path.join(staging, 'SOURCES.txt'), 'w') as f:
+            f.write(''.join(os.path.basename(egg) + '\n' for egg in eggs))
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def main(argv):
+    target = argv[1] if len(argv) > 1 else lib_dir
+    build(egg_paths(), target)
+    print 'built %s' % target
+
+
+if __name__ == '__main__':
+    main(sys.argv)
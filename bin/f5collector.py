@@ -0,0 +1,410 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import logging
+import signal
+import sys
+import threading
+import time
+from cStringIO import StringIO
+from splunklib.modularinput import Script, Scheme, Argument, Event, EventWriter
+from splunklib.searchcommands import validators
+from f5query import F5Client, ThreadPool, Timings, get_stanza, get_device_stanza, \
+    get_credentials, setup_logger, logger, metrics, flush_metrics
+
+POLLING_INTERVAL = 60
+COLLECTOR_THREADS = 16
+# seconds between appends of the collector metrics to METRICS_PATH
+METRICS_INTERVAL = 60
+# BatchEventWriter writes buffered events once they reach BATCH_BYTES or the oldest is BATCH_DELAY seconds old
+BATCH_BYTES = 65536
+BATCH_DELAY = 1.0
+# user and app storage/passwords is read as, the session key of a modular input is that of splunk-system-user
+NAMESPACE = ('splunk-system-user', 'f5query')
+
+
+def escape_text(text):
+    """
+    Returns text escaped and encoded as ElementTree.tostring writes element text
+    :param text: element text
+    :type text: str or unicode
+    :return: str
+    """
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text.encode('us-ascii', 'xmlcharrefreplace')
+
+
+def escape_attribute(text):
+    """
+    Returns text escaped and encoded as ElementTree.tostring writes attribute values
+    :param text: attribute value
+    :type text: str or unicode
+    :return: str
+    """
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+    return text.replace('\n', '&#10;').encode('us-ascii', 'xmlcharrefreplace')
+
+
+def element(tag, text):
+    """
+    Returns an element without attributes or children as ElementTree.tostring writes it
+    :param tag: element name
+    :type tag: str
+    :param text: element text
+    :type text: str or unicode
+    :return: str
+    """
+    return '<%s>%s</%s>' % (tag, escape_text(text), tag) if text else '<%s />' % tag
+
+
+class BatchEventWriter(EventWriter):
+    """
+    EventWriter writing events from per input templates into a buffer, rather than an ElementTree per event
+    flushed on its own. The stanza, sourcetype, index and other fixed parts of an event are escaped once, only
+    time and data are escaped per event. Output is byte for byte that of EventWriter, events Event.write_to
+    would fail on, or write differently such as empty data, go through Event.write_to.
+    """
+
+    def __init__(self, output=sys.stdout, error=sys.stderr, max_bytes=BATCH_BYTES, max_delay=BATCH_DELAY):
+        super(BatchEventWriter, self).__init__(output, error)
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._buffer = list()
+        self._size = 0
+        self._oldest = None
+        self._templates = dict()
+
+    def template(self, event, key):
+        """
+        Returns the parts of an event before its time, between time and data and after data, None when a part is
+        not a string
+        :param event: event to write
+        :type event: splunklib.modularinput.Event
+        :param key: stanza, unbroken, source, sourcetype, index, host and done of the event
+        :type key: tuple
+        :return: tuple or None
+        """
+        if not all(value is None or isinstance(value, basestring) for value in key[:1] + key[2:6]):
+            return None
+        opening = '<event%s unbroken="%s">' % (
+            '' if event.stanza is None else ' stanza="%s"' % escape_attribute(event.stanza),
+            escape_attribute(str(int(event.unbroken))))
+        middle = ''.join(element(tag, value) for tag, value in [('source', event.source),
+                                                                ('sourcetype', event.sourceType),
+                                                                ('index', event.index), ('host', event.host)]
+                         if value is not None) + '<data>'
+        closing = '</data><done /></event>' if event.done is not None else '</data></event>'
+        template = self._templates[key] = (opening, middle, closing)
+        return template
+
+    def write_event(self, event):
+        """Buffers an ``Event`` object, flushing the buffer when it is full or old enough.
+
+        :param event: An ``Event`` object.
+        """
+        data = event.data
+        template = None
+        if data and isinstance(data, basestring):
+            key = (event.stanza, event.unbroken, event.source, event.sourceType, event.index, event.host,
+                   event.done is not None)
+            template = self._templates.get(key) or self.template(event, key)
+        if template is None:
+            stream = StringIO()
+            event.write_to(stream)
+            text = stream.getvalue()
+        else:
+            opening, middle, closing = template
+            if event.time is not None:
+                opening += element('time', str(event.time))
+            text = opening + middle + escape_text(data) + closing
+
+        buffered = self._buffer
+        if not buffered:
+            self._oldest = time.time()
+            if not self.header_written:
+                buffered.append('<stream>')
+                self.header_written = True
+        buffered.append(text)
+        self._size += len(text)
+        if self._size >= self.max_bytes or time.time() - self._oldest >= self.max_delay:
+            self.flush()
+
+    def flush(self, max_age=0):
+        """Writes buffered events when the oldest of them is at least max_age seconds old.
+
+        :param max_age: ``float``, seconds, 0 to write them now.
+        """
+        if self._buffer and (max_age <= 0 or time.time() - self._oldest >= max_age):
+            buffered, self._buffer, self._size = self._buffer, list(), 0
+            self._out.write(''.join(buffered))
+            self._out.flush()
+
+    def write_xml_document(self, document):
+        self.flush()
+        super(BatchEventWriter, self).write_xml_document(document)
+
+    def close(self):
+        self.flush()
+        super(BatchEventWriter, self).close()
+
+
+class DeviceCollector(object):
+    """
+    Polls the F5 device of one f5collector input
+    The F5Client, with its loaded WSDLs, is kept from one poll to the next. It is replaced when the credentials
+    of the device change and after a failed call, which is then retried once with the new client.
+    """
+
+    def __init__(self, name, params):
+        self.name = name
+        self.device = params['device']
+        self.pools = params.get('pools')
+        self.pool_only = validators.Boolean()(params.get('pool_only') or None) or False
+        self.vservers = params.get('vservers')
+        self.stats = validators.Boolean()(params.get('stats') or None) or False
+        self.partition = params.get('partition')
+        self.interval = float(params.get('polling_interval') or POLLING_INTERVAL)
+        self.index = params.get('index')
+        self.sourcetype = params.get('sourcetype') or 'icontrol'
+        self.client = None
+        self.credentials = None
+        self.busy = False
+
+    def connect(self, service, timings):
+        """
+        Returns the F5Client of the device, created on first use, after a failed poll and when the credentials
+        read for the device, cached for credential_cache_ttl seconds, differ from those of the client
+        The partition is made active on every call, it is a setting of the user on the device rather than of
+        the client.
+        :param service: splunkd service of the input
+        :type service: splunklib.client.Service
+        :param timings: spans of this poll
+        :type timings: Timings
+        :return: F5Client
+        """
+        with timings.span('credentials'):
+            conf = get_device_stanza('f5query', 'f5query', self.device)
+            credentials = tuple(get_credentials(lambda: service, self.device, conf, NAMESPACE))
+        if self.client is None or credentials != self.credentials:
+            self.client = F5Client(credentials[0], credentials[1], self.device, timings)
+            self.credentials = credentials
+        self.client.timings = timings
+        if self.partition:
+            self.client.set_partition(self.partition)
+        return self.client
+
+    def fetch(self, f5):
+        """
+        Makes the iControl calls of this input, one after the other, parallelism is across devices
+        :param f5: client of the device
+        :type f5: F5Client
+        :return: None
+        """
+        if self.vservers:
+            f5.vserver_list(None if self.vservers.lower() == 'all' else self.vservers)
+            if self.stats:
+                f5.vserver_stats()
+            f5.vserver_dest()
+            f5.vserver_pool()
+        if self.pools:
+            f5.pool_list(None if self.pools.lower() == 'all' else self.pools)
+            f5.pool_status()
+            if not self.pool_only:
+                if self.stats:
+                    f5.pool_member_stats()
+                f5.pool_members()
+                f5.pool_member_status()
+
+    def events(self, f5):
+        """
+        Yields an event of each pool, pool member and virtual server record, _raw as compact json
+        :param f5: client of the device after fetch
+        :type f5: F5Client
+        :return: generator
+        """
+        outputs = list()
+        if self.pools:
+            outputs.append(f5.pools_output('compact'))
+        if self.vservers:
+            outputs.append(f5.vserver_output('compact'))
+        for output in outputs:
+            for record in output:
+                yield Event(data=record['_raw'], stanza=self.name, time='%.3f' % record['_time'], host=self.device,
+                            index=self.index, source='f5', sourcetype=self.sourcetype)
+
+    def poll(self, service, write_events):
+        """
+        Polls the device once and writes its events
+        A failure drops the client and is retried once with a new one, so that an expired login or a device
+        failover does not lose the events of the interval. A second failure is logged.
+        :param service: splunkd service of the input
+        :type service: splunklib.client.Service
+        :param write_events: writes a list of events, returns False once the input is stopping
+        :type write_events: function
+        :return: None
+        """
+        start = time.time()
+        try:
+            for attempt in (1, 2):
+                timings = Timings()
+                try:
+                    f5 = self.connect(service, timings)
+                    self.fetch(f5)
+                    events = list(self.events(f5))
+                    break
+                except Exception as e:
+                    self.client = None
+                    metrics.inc('collector_errors', device=self.device)
+                    if attempt == 2:
+                        logger.error('%s: polling %s failed, %s' % (self.name, self.device, e))
+                        return
+                    logger.warning('%s: polling %s failed, retrying with a new client, %s' %
+                                   (self.name, self.device, e))
+            if write_events(events):
+                metrics.inc('collector_events', len(events), device=self.device)
+        except Exception as e:
+            metrics.inc('collector_errors', device=self.device)
+            logger.error('%s: writing events of %s failed, %s' % (self.name, self.device, e))
+        finally:
+            metrics.inc('collector_polls', device=self.device)
+            metrics.observe('collector_poll_seconds', time.time() - start, device=self.device)
+            self.busy = False
+
+
+class F5CollectorScript(Script):
+    """
+    Modular input polling F5 devices for pool, pool member and virtual server events
+    All f5collector inputs run in one process, use_single_instance, on its own scheduler. Polls run on a pool of
+    collector_threads threads so that a slow device delays only itself.
+    """
+
+    def __init__(self):
+        super(F5CollectorScript, self).__init__()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._ew = None
+
+    def run(self, args):
+        return self.run_script(args, BatchEventWriter(), sys.stdin)
+
+    def get_scheme(self):
+        scheme = Scheme('F5 iControl Collector')
+        scheme.description = 'Polls F5 devices through iControl and indexes pool, pool member and virtual ' \
+                             'server status and statistics.'
+        scheme.use_external_validation = True
+        scheme.use_single_instance = True
+        scheme.add_argument(Argument('device', title='Device', description='IP Address or FQDN of the F5 device',
+                                     required_on_create=True))
+        scheme.add_argument(Argument('pools', title='Pools',
+                                     description='Comma separated list of pools, all for every pool'))
+        scheme.add_argument(Argument('pool_only', title='Pool only', description='Only poll pool status',
+                                     data_type=Argument.data_type_boolean))
+        scheme.add_argument(Argument('vservers', title='Virtual servers',
+                                     description='Comma separated list of virtual servers, all for every one'))
+        scheme.add_argument(Argument('stats', title='Statistics', description='Poll statistics',
+                                     data_type=Argument.data_type_boolean))
+        scheme.add_argument(Argument('partition', title='Partition', description='F5 partition name'))
+        scheme.add_argument(Argument('polling_interval', title='Polling interval',
+                                     description='Seconds between polls of the device, defaults to %d' %
+                                                 POLLING_INTERVAL,
+                                     data_type=Argument.data_type_number))
+        return scheme
+
+    def validate_input(self, definition):
+        params = definition.parameters
+        if not params.get('device'):
+            raise ValueError('device is required')
+        if not (params.get('pools') or params.get('vservers')):
+            raise ValueError('set pools, vservers or both')
+        for name in ('pool_only', 'stats'):
+            validators.Boolean()(params.get(name) or None)
+        if params.get('polling_interval') and float(params['polling_interval']) <= 0:
+            raise ValueError('polling_interval must be positive')
+
+    def write_events(self, events=()):
+        """
+        Writes the events of one poll together, polls of other devices wait
+        Events the writer has buffered for BATCH_DELAY seconds are flushed, call without events to only flush them.
+        :param events: events of a poll
+        :type events: list
+        :return: False when the input is stopping and nothing was written
+        """
+        with self._lock:
+            if self._stopping.is_set():
+                return False
+            try:
+                for event in events:
+                    self._ew.write_event(event)
+                if isinstance(self._ew, BatchEventWriter):
+                    self._ew.flush(BATCH_DELAY)
+            except IOError as e:
+                # splunkd closed the pipe, it is shutting down or restarting the input
+                logger.error('unable to write events, stopping: %s' % e)
+                self._stopping.set()
+                return False
+        return True
+
+    def stream_events(self, inputs, ew):
+        setup_logger(logging.INFO)
+        self._ew = ew
+        collectors = [DeviceCollector(name, params) for name, params in sorted(inputs.inputs.items())]
+        if not collectors:
+            return
+        threads = int(get_stanza('f5query', 'f5query').get('collector_threads', COLLECTOR_THREADS))
+        pool = ThreadPool(max(1, min(threads, len(collectors))))
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stopping.set())
+        logger.info('f5collector polling %d inputs on %d threads' % (len(collectors), min(threads, len(collectors))))
+
+        # first polls are spread over the polling interval so that devices are not all polled at once
+        now = time.time()
+        schedule = [(now + collector.interval * n / len(collectors), n) for n, collector in enumerate(collectors)]
+        heapq.heapify(schedule)
+        flushed = now
+        while not self._stopping.is_set():
+            now = time.time()
+            if now - flushed >= METRICS_INTERVAL:
+                flush_metrics()
+                flushed = now
+            self.write_events()
+            due, n = schedule[0]
+            if due > now:
+                # a timeout keeps SIGTERM handled while waiting
+                self._stopping.wait(min(due, flushed + METRICS_INTERVAL, now + BATCH_DELAY) - now)
+                continue
+            collector = collectors[n]
+            if collector.busy:
+                logger.warning('%s: previous poll of %s still running, skipping this interval' %
+                               (collector.name, collector.device))
+                metrics.inc('collector_overruns', device=collector.device)
+            else:
+                collector.busy = True
+                pool.add_task(collector.poll, self.service, self.write_events)
+            # intervals missed while behind are skipped rather than polled back to back
+            heapq.heapreplace(schedule, (due + collector.interval * (1 + int((now - due) / collector.interval)), n))
+
+        # polls still running see _stopping once they get the lock and write nothing after </stream>
+        with self._lock:
+            pass
+        flush_metrics()
+        logger.info('f5collector stopped')
+
+
+if __name__ == '__main__':
+    sys.exit(F5CollectorScript().run(sys.argv))
@@ -25,39 +25,76 @@ __email__ = 'bmacias@httpstergeek.com'
 __status__ = 'Production'
 
 import os
+import errno
+import marshal
 import logging
-import logging.handlers
 import sys
 import json
+import random
+import socket
 import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 import time
-from platform import system
-from splunk.clilib import cli_common as cli
 from splunklib.searchcommands import \
-    dispatch, GeneratingCommand, Configuration, Option
+    dispatch, GeneratingCommand, Configuration, Option, validators
 
-platform = system().lower()
-
-# Loading eggs into python execution path
-if platform == 'darwin':
-    platform = 'macosx'
+# suds, bigsuds, splunk.clilib and the log file handler are loaded on first use, Splunk runs this script for
+# __GETINFO__ on every search parse and that phase needs none of them.
 running_dir = os.path.dirname(os.path.realpath(__file__))
-egg_dir = os.path.join(running_dir, 'eggs')
-for filename in os.listdir(egg_dir):
-    file_segments = filename.split('-')
-    if filename.endswith('.egg'):
-        filename = os.path.join(egg_dir, filename)
-        if len(file_segments) <= 3:
-            sys.path.append(filename)
-        else:
-            if platform in filename:
-                sys.path.append(filename)
+# Dependencies unpacked from the eggs and byte-compiled by build_lib.py for this python version
+lib_dir = os.path.join(running_dir, 'lib', 'py%d%d' % sys.version_info[:2])
+bigsuds = None
+
+
+def egg_paths():
+    """
+    Returns the eggs in bin/eggs that apply to this platform
+    :return: list
+    """
+    from platform import system
+    platform = system().lower()
+    if platform == 'darwin':
+        platform = 'macosx'
+    egg_dir = os.path.join(running_dir, 'eggs')
+    paths = list()
+    for filename in os.listdir(egg_dir):
+        file_segments = filename.split('-')
+        if filename.endswith('.egg'):
+            filename = os.path.join(egg_dir, filename)
+            if len(file_segments) <= 3:
+                paths.append(filename)
+            else:
+                if platform in filename:
+                    paths.append(filename)
+    return paths
 
-import suds
-import bigsuds
+
+def load_bigsuds():
+    """
+    Adds lib_dir, or the eggs when it has not been built, to python execution path and imports bigsuds, once
+    :return: bigsuds module
+    """
+    global bigsuds
+    if bigsuds is None:
+        if os.path.isdir(lib_dir):
+            sys.path.insert(0, lib_dir)
+        else:
+            sys.path.extend(egg_paths())
+        import bigsuds
+    return bigsuds
 
 SPLUNK_HOME = os.environ.get('SPLUNK_HOME')
+RUN_DIR = os.path.join(SPLUNK_HOME, 'var', 'run', 'f5query') if SPLUNK_HOME else None
+CREDENTIAL_REALM = 'f5query'
+CREDENTIAL_CACHE_TTL = 300
+PROFILE_DIR = os.path.join(RUN_DIR, 'profiles') if RUN_DIR else None
+PROFILE_KEEP = 20
+METRICS_PATH = os.path.join(RUN_DIR, 'metrics.jsonl') if RUN_DIR else None
+METRICS_MAX_BYTES = 5000000
+# upper bounds in seconds of the iControl call latency histogram buckets, a last bucket holds slower calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
 
 def setup_logger(level):
     """
@@ -65,7 +102,12 @@ def setup_logger(level):
         :type level: logger object
         :return : logger object
     """
+    import logging.handlers
     logger = logging.getLogger('f5query')
+    # fileConfig of the search command logging.conf disables loggers it does not name, this one included
+    logger.disabled = False
+    if logger.handlers:
+        return logger
     logger.propagate = False  # Prevent the log messages from being duplicated in the python.log file
     logger.setLevel(level)
     file_handler = logging.handlers.RotatingFileHandler(os.path.join(SPLUNK_HOME, 'var', 'log', 'splunk', 'f5query.log'),
@@ -80,7 +122,109 @@ def setup_logger(level):
     return logger
 
 
-logger = setup_logger(logging.INFO)
+logger = logging.getLogger('f5query')
+
+
+_confs = dict()
+
+
+def conf_fingerprint(paths):
+    """
+    Returns the path, modification time and size of each conf file, None for missing files
+    :param paths: conf file paths
+    :type paths: list
+    :return: tuple
+    """
+    fingerprint = list()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            fingerprint.append((path, None, None))
+        else:
+            fingerprint.append((path, stat.st_mtime, stat.st_size))
+    return tuple(fingerprint)
+
+
+def read_cache(cachepath):
+    """
+    Returns the value stored in a cache file, None if it is missing, unreadable or not private to this user
+    :param cachepath: cache file path
+    :type cachepath: str
+    :return: object or None
+    """
+    try:
+        with open(cachepath, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_uid != os.getuid() or stat.st_mode & 077:
+                logger.warning('ignoring cache %s, it is not private to this user' % cachepath)
+                return None
+            return marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def write_cache(cachepath, value):
+    """
+    Writes value to a cache file, readable by the owner only as caches hold credentials
+    :param cachepath: cache file path
+    :type cachepath: str
+    :param value: marshal serializable value
+    :type value: object
+    :return: None
+    """
+    # threads of one process, f5collector polls, write caches too
+    tmppath = '%s.%d.%d' % (cachepath, os.getpid(), threading.current_thread().ident)
+    try:
+        try:
+            os.makedirs(os.path.dirname(cachepath), 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd = os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(value, f)
+        os.rename(tmppath, cachepath)
+    except (IOError, OSError, ValueError) as e:
+        logger.warning('unable to write cache %s: %s' % (cachepath, e))
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+
+
+def get_conf(conf):
+    """
+    Returns dict object of all stanzas of default and local conf file merged
+    Merged settings are cached in RUN_DIR until either file changes
+    :param conf: Splunk conf file name
+    :type conf: str
+    :return: dict
+    """
+    appdir = os.path.dirname(running_dir)
+    conf = "%s.conf" % conf
+    apikeyconfpath = os.path.join(appdir, "default", conf)
+    localconfpath = os.path.join(appdir, "local", conf)
+    fingerprint = conf_fingerprint([apikeyconfpath, localconfpath])
+    if conf in _confs and _confs[conf][0] == fingerprint:
+        metrics.inc('cache_hits', cache=conf, store='memory')
+        return _confs[conf][1]
+    cachepath = os.path.join(RUN_DIR, '%s.cache' % conf) if RUN_DIR else None
+    cached = read_cache(cachepath) if cachepath else None
+    apikeyconf = cached[1] if isinstance(cached, tuple) and cached[0] == fingerprint else None
+    metrics.inc('cache_misses' if apikeyconf is None else 'cache_hits', cache=conf, store='file')
+    if apikeyconf is None:
+        from splunk.clilib import cli_common as cli
+        apikeyconf = dict((name, dict(content)) for name, content in cli.readConfFile(apikeyconfpath).items())
+        if os.path.exists(localconfpath):
+            localconf = cli.readConfFile(localconfpath)
+            for name, content in localconf.items():
+                if name in apikeyconf:
+                    apikeyconf[name].update(content)
+                else:
+                    apikeyconf[name] = dict(content)
+        if cachepath:
+            write_cache(cachepath, (fingerprint, apikeyconf))
+    _confs[conf] = (fingerprint, apikeyconf)
+    return apikeyconf
 
 
 def get_stanza(conf, stanza):
@@ -90,27 +234,115 @@ def get_stanza(conf, stanza):
     :param stanza: stanza (entry) from conf file
     :return: returns dictionary of setting
     """
-    appdir = os.path.dirname(os.path.dirname(__file__))
-    conf = "%s.conf" % conf
-    apikeyconfpath = os.path.join(appdir, "default", conf)
-    apikeyconf = cli.readConfFile(apikeyconfpath)
-    localconfpath = os.path.join(appdir, "local", conf)
-    if os.path.exists(localconfpath):
-        localconf = cli.readConfFile(localconfpath)
-        for name, content in localconf.items():
-            if name in apikeyconf:
-                apikeyconf[name].update(content)
-            else:
-                apikeyconf[name] = content
-    return apikeyconf[stanza]
+    return get_conf(conf)[stanza]
+
+
+def get_device_stanza(conf, stanza, device):
+    """
+    Returns config file settings for a device, [device:<device>] settings override the stanza settings
+    :param conf: Splunk conf file name
+    :type conf: str
+    :param stanza: stanza (entry) from conf file
+    :type stanza: str
+    :param device: IP Address or FQDN of device
+    :type device: str
+    :return: dict
+    """
+    settings = get_conf(conf)
+    device_settings = dict(settings[stanza])
+    device_settings.update(settings.get('device:%s' % device, {}))
+    return device_settings
 
 
-def tojson(jmessage):
-    jmessage = json.dumps(json.loads(json.JSONEncoder().encode(jmessage)),
-                          indent=4,
-                          sort_keys=True,
-                          ensure_ascii=True)
-    return jmessage
+_credentials = dict()
+
+
+def storage_password(service, device):
+    """
+    Returns user and password for a device from storage/passwords in one request
+    Credentials stored with realm <device> are preferred over those stored with realm CREDENTIAL_REALM
+    :param service: splunkd service of the search
+    :type service: splunklib.client.Service
+    :param device: IP Address or FQDN of device
+    :type device: str
+    :return: tuple or None
+    """
+    found = dict()
+    for credential in service.storage_passwords.list():
+        if credential.realm in (device, CREDENTIAL_REALM):
+            found[credential.realm] = (credential.username, credential.clear_password)
+    return found.get(device, found.get(CREDENTIAL_REALM))
+
+
+def get_credentials(get_service, device, settings, namespace):
+    """
+    Returns user and password for a device
+    Credentials come from storage/passwords when a service is available, else from the user and password settings.
+    They are cached per user, app and device in process and, readable by the owner only and in plain text, in RUN_DIR
+    for credential_cache_ttl seconds. The user and password settings a failed storage/passwords read falls back to
+    are not cached.
+    get_service is only called on a cache miss, building the service imports splunklib.client and reads
+    search_results_info.
+    :param get_service: returns the splunkd service of the search or None
+    :type get_service: function
+    :param device: IP Address or FQDN of device
+    :type device: str
+    :param settings: get_device_stanza settings of the device
+    :type settings: dict
+    :param namespace: user and app storage/passwords is read as
+    :type namespace: tuple
+    :return: tuple
+    """
+    ttl = float(settings.get('credential_cache_ttl', CREDENTIAL_CACHE_TTL))
+    now = time.time()
+    key = '%s/%s/%s' % (namespace[0], namespace[1], device)
+    cachepath = os.path.join(RUN_DIR, 'credentials.cache') if RUN_DIR and ttl > 0 else None
+    cached = _credentials.get(key)
+    store = 'memory'
+    if cached is None and cachepath:
+        store = 'file'
+        cache = read_cache(cachepath)
+        cached = cache.get(key) if isinstance(cache, dict) else None
+    if cached is not None and now < cached[0] <= now + ttl:
+        metrics.inc('cache_hits', cache='credentials', store=store)
+        _credentials[key] = cached
+        return cached[1], cached[2]
+    metrics.inc('cache_misses', cache='credentials', store=store)
+
+    credential = None
+    failed = False
+    try:
+        service = get_service()
+        if service is not None:
+            credential = storage_password(service, device)
+    except Exception as e:
+        logger.warning('unable to read storage/passwords for %s: %s' % (device, e))
+        failed = True
+    if credential is None:
+        credential = (settings['user'], settings['password'])
+    if ttl > 0 and not failed:
+        cached = (now + ttl,) + tuple(credential)
+        _credentials[key] = cached
+        if cachepath:
+            cache = read_cache(cachepath)
+            cache = dict((k, v) for k, v in cache.items() if v[0] > now) if isinstance(cache, dict) else dict()
+            cache[key] = cached
+            write_cache(cachepath, cache)
+    return credential
+
+
+def tojson(jmessage, raw='pretty'):
+    """
+    Serializes record to json for _raw
+    :param jmessage: record
+    :type jmessage: dict
+    :param raw: json layout, compact or pretty
+    :type raw: str
+    :return: str
+    """
+    if raw == 'compact':
+        return json.dumps(jmessage, separators=(',', ':'), sort_keys=True, ensure_ascii=True)
+    return json.dumps(jmessage, indent=4, sort_keys=True, ensure_ascii=True)
 
 
 def convert_64bit(signed_high, signed_low):
@@ -132,13 +364,387 @@ def convert_64bit(signed_high, signed_low):
     return unsigned_value
 
 
+class Timings(object):
+    """
+    Durations, bytes received, record and error counts of the phases of one f5query invocation
+    Spans are named after iControl calls, LocalLB.Pool.get_member_v2, or phases: credentials, wsdl <interface>,
+    pools_output and vserver_output (tojson included), tojson and consumer. The threads of an invocation share one.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.spans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, **counts):
+        """
+        Adds a duration and counts, such as bytes or records, to a span
+        :param name: span name
+        :type name: str
+        :param seconds: duration
+        :type seconds: float
+        :return: None
+        """
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                span = self.spans[name] = {'calls': 0, 'seconds': 0.0}
+            span['calls'] += 1
+            span['seconds'] += seconds
+            for count, value in counts.items():
+                span[count] = span.get(count, 0) + value
+
+    @contextmanager
+    def span(self, name, **counts):
+        """
+        Times the body of a with statement as a span
+        :param name: span name
+        :type name: str
+        :return: context manager
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - start, **counts)
+
+    def summary(self):
+        """
+        Returns the spans as one line for the messages header
+        :return: str
+        """
+        spans = list()
+        for name, span in self.spans.items():
+            text = '%s %dx %.3fs' % (name, span['calls'], span['seconds'])
+            if span.get('bytes'):
+                text += ' %dB' % span['bytes']
+            if span.get('records'):
+                text += ' %d records' % span['records']
+            if span.get('errors'):
+                text += ' %d errors' % span['errors']
+            spans.append(text)
+        return 'total %.3fs; %s' % (time.time() - self.started, '; '.join(spans))
+
+    def log(self, device):
+        """
+        Writes the spans to the log as json
+        :param device: IP Address or FQDN of device
+        :type device: str
+        :return: None
+        """
+        spans = OrderedDict((name, dict(span, seconds=round(span['seconds'], 6))) for name, span in self.spans.items())
+        logger.info('timings %s' % json.dumps({'device': device, 'seconds': round(time.time() - self.started, 6),
+                                                'spans': spans}, separators=(',', ':')))
+
+
+def timed(records, timings, name):
+    """
+    Yields records, adding the time spent building each to span name and the time between yields to span consumer
+    The consumer span is the search command writing the record, CSV encoding and output to splunkd, and whatever
+    else runs before the next record is asked for.
+    :param records: record generator
+    :type records: generator
+    :param timings: Timings of the invocation
+    :type timings: Timings
+    :param name: span name
+    :type name: str
+    :return: generator
+    """
+    clock = time.time()
+    for record in records:
+        now = time.time()
+        timings.add(name, now - clock, records=1)
+        yield record
+        clock = time.time()
+        timings.add('consumer', clock - now)
+
+
+class Metrics(object):
+    """
+    Counters and latency histograms of this process, by name and labels
+    flush appends what was counted since the last flush as one json line to METRICS_PATH, so the lines of all
+    f5query processes add up. f5querystats reads them back with read_metrics.
+    """
+
+    def __init__(self):
+        self._counters = dict()
+        self._histograms = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds value to a counter
+        :param name: counter name
+        :type name: str
+        :param value: increment
+        :type value: int
+        :return: None
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """
+        Counts a duration in a LATENCY_BUCKETS histogram
+        :param name: histogram name
+        :type name: str
+        :param seconds: duration
+        :type seconds: float
+        :return: None
+        """
+        key = (name, tuple(sorted(labels.items())))
+        bucket = len(LATENCY_BUCKETS)
+        for n, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                bucket = n
+                break
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+
+    def flush(self, path, max_bytes=METRICS_MAX_BYTES):
+        """
+        Appends the counts since the last flush to path, which is rotated to path.1 beyond max_bytes
+        :param path: metrics file name
+        :type path: str
+        :param max_bytes: size at which the file is rotated
+        :type max_bytes: int
+        :return: None
+        """
+        with self._lock:
+            counters, self._counters = self._counters, dict()
+            histograms, self._histograms = self._histograms, dict()
+        if not (counters or histograms):
+            return
+        line = json.dumps({
+            'time': round(time.time(), 3),
+            'pid': os.getpid(),
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in counters.items()],
+            'histograms': [{'name': name, 'labels': dict(labels), 'buckets': buckets, 'sum': round(total, 6)}
+                           for (name, labels), (buckets, total) in histograms.items()]},
+            separators=(',', ':'), sort_keys=True) + '\n'
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), 0700)
+        try:
+            if os.path.getsize(path) > max_bytes:
+                os.rename(path, path + '.1')
+        except OSError:
+            pass
+        # a single write to a file opened for appending keeps lines of concurrent searches whole
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0600)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+metrics = Metrics()
+
+
+def flush_metrics():
+    """
+    Appends the metrics of this process to METRICS_PATH, failing only with a warning in the log
+    :return: None
+    """
+    if METRICS_PATH:
+        try:
+            metrics.flush(METRICS_PATH)
+        except Exception as e:
+            logger.warning('unable to write metrics to %s: %s' % (METRICS_PATH, e))
+
+
+def read_metrics(path, since=0):
+    """
+    Returns the counters and histograms flushed to path and path.1 since a time, summed by name and labels
+    :param path: metrics file name
+    :type path: str
+    :param since: epoch seconds, 0 for all
+    :type since: float
+    :return: tuple of counters, histograms and the time of the last flush
+    """
+    counters = dict()
+    histograms = dict()
+    last = None
+    for filename in (path + '.1', path):
+        try:
+            f = open(filename)
+        except IOError:
+            continue
+        with f:
+            for line in f:
+                try:
+                    flushed = json.loads(line)
+                except ValueError:
+                    continue
+                if flushed['time'] < since:
+                    continue
+                last = max(last, flushed['time'])
+                for counter in flushed['counters']:
+                    key = (counter['name'], tuple(sorted(counter['labels'].items())))
+                    counters[key] = counters.get(key, 0) + counter['value']
+                for histogram in flushed['histograms']:
+                    key = (histogram['name'], tuple(sorted(histogram['labels'].items())))
+                    buckets, total = histograms.get(key, ([0] * len(histogram['buckets']), 0.0))
+                    histograms[key] = ([a + b for a, b in zip(buckets, histogram['buckets'])],
+                                       total + histogram['sum'])
+    return counters, histograms, last
+
+
+def histogram_quantile(buckets, q):
+    """
+    Returns the upper bound of the LATENCY_BUCKETS bucket holding the q quantile, None when it is the last bucket
+    :param buckets: counts per bucket
+    :type buckets: list
+    :param q: quantile, 0 to 1
+    :type q: float
+    :return: float
+    """
+    rank = q * sum(buckets)
+    seen = 0
+    for n, count in enumerate(buckets):
+        seen += count
+        if count and seen >= rank:
+            return LATENCY_BUCKETS[n] if n < len(LATENCY_BUCKETS) else None
+    return None
+
+
+_replies = threading.local()
+
+
+def reply_size_plugin():
+    """
+    Returns a suds plugin that notes the size of each reply for the thread that received it, in _replies.size
+    :return: suds.plugin.MessagePlugin
+    """
+    from suds.plugin import MessagePlugin
+
+    class ReplySize(MessagePlugin):
+        def received(self, context):
+            _replies.size = len(context.reply)
+    return ReplySize()
+
+
+class Profiler(object):
+    """
+    Profiles one f5query invocation
+    cpu runs cProfile in the generate thread and in every worker thread, and dumps the merged pstats.
+    memory dumps a tracemalloc snapshot where tracemalloc is available (python 3), otherwise peak RSS and a census of
+    the live objects at the end of the run, when the iControl results are still held.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.started = time.time()
+        self._profiles = list()
+        self._lock = threading.Lock()
+        self._tracemalloc = None
+        if mode == 'cpu':
+            import cProfile
+            self._profile = cProfile.Profile
+            self._main = self._profile()
+            self._main.enable()
+        else:
+            try:
+                import tracemalloc
+            except ImportError:
+                pass
+            else:
+                self._tracemalloc = tracemalloc
+                tracemalloc.start(25)
+
+    @classmethod
+    def sample(cls, mode, settings):
+        """
+        Returns a started Profiler for mode, or for profile_sample_mode in a share of runs of profile_sample_rate
+        :param mode: profile option, cpu, memory or None
+        :type mode: str
+        :param settings: get_device_stanza settings of the device
+        :type settings: dict
+        :return: Profiler or None
+        """
+        if mode is None and random.random() < float(settings.get('profile_sample_rate', 0)):
+            mode = settings.get('profile_sample_mode', 'cpu')
+        return cls(mode) if mode in ('cpu', 'memory') else None
+
+    def wrap(self, target):
+        """
+        Returns target profiled in the thread that runs it
+        :param target: function or method.
+        :type target: object
+        :return: function
+        """
+        if self.mode != 'cpu':
+            return target
+
+        def run():
+            profile = self._profile()
+            try:
+                profile.runcall(target)
+            finally:
+                with self._lock:
+                    self._profiles.append(profile)
+        return run
+
+    def stop(self, directory, keep=PROFILE_KEEP):
+        """
+        Stops profiling, writes the dump to directory and removes all but the newest keep dumps
+        :param directory: profile directory
+        :type directory: str
+        :param keep: number of dumps to keep
+        :type keep: int
+        :return: dump file name
+        """
+        import resource
+        name = '%s-%d-%s' % (time.strftime('%Y%m%dT%H%M%S', time.localtime(self.started)), os.getpid(), self.mode)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0700)
+        if self.mode == 'cpu':
+            import pstats
+            self._main.disable()
+            stats = pstats.Stats(self._main)
+            with self._lock:
+                for profile in self._profiles:
+                    stats.add(profile)
+            path = os.path.join(directory, name + '.pstats')
+            stats.dump_stats(path)
+        elif self._tracemalloc is not None:
+            path = os.path.join(directory, name + '.tracemalloc')
+            self._tracemalloc.take_snapshot().dump(path)
+            self._tracemalloc.stop()
+        else:
+            import gc
+            counts = dict()
+            for obj in gc.get_objects():
+                counts[type(obj).__name__] = counts.get(type(obj).__name__, 0) + 1
+            path = os.path.join(directory, name + '.txt')
+            with open(path, 'w') as f:
+                f.write('peak_rss_kb %d\nseconds %.3f\n\n' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                                                 time.time() - self.started))
+                for type_name, count in sorted(counts.items(), key=lambda item: -item[1])[:100]:
+                    f.write('%10d %s\n' % (count, type_name))
+        dumps = sorted(filename for filename in os.listdir(directory) if filename.split('.')[-1] in
+                       ('pstats', 'tracemalloc', 'txt'))
+        for filename in dumps[:max(len(dumps) - keep, 0)]:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+        return path
+
+
 class Worker(threading.Thread):
     """
     Simple Threading Class
     """
     # TODO rewrite to use daemon and exception handling
-    def __init__(self):
+    def __init__(self, wrap=None):
         self.jobs = list()
+        self.wrap = wrap
 
     def run(self, target=None):
         """
@@ -148,7 +754,7 @@ class Worker(threading.Thread):
         :return: None
         """
         if target:
-            job = threading.Thread(target=target)
+            job = threading.Thread(target=self.wrap(target) if self.wrap else target)
             self.jobs.append(job)
             job.start()
 
@@ -157,8 +763,44 @@ class ThreadPool:
     """
     Pool of threads consuming tasks from a queue
     """
-    # TODO add add_task and wait_completion methods
-    pass
+
+    def __init__(self, num_threads):
+        import Queue
+        self.tasks = Queue.Queue()
+        for n in range(num_threads):
+            thread = threading.Thread(target=self.consume, name='f5query-pool-%d' % n)
+            thread.daemon = True
+            thread.start()
+
+    def consume(self):
+        """
+        Runs tasks until the process exits, a failed task is logged and does not end its thread
+        :return: None
+        """
+        while True:
+            func, args, kwargs = self.tasks.get()
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                logger.exception('task %s failed' % getattr(func, '__name__', func))
+            finally:
+                self.tasks.task_done()
+
+    def add_task(self, func, *args, **kwargs):
+        """
+        Queues func to be called by the next free thread
+        :param func: function or method
+        :type func: object
+        :return: None
+        """
+        self.tasks.put((func, args, kwargs))
+
+    def wait_completion(self):
+        """
+        Blocks until every queued task is done
+        :return: None
+        """
+        self.tasks.join()
 
 
 class F5Client():
@@ -166,12 +808,17 @@ class F5Client():
         Connects to F5 iControl interface
     """
 
-    def __init__(self, user, passwd, host):
+    def __init__(self, user, passwd, host, timings=None):
+        load_bigsuds()
+        self.host = host
+        self.timings = timings or Timings()
         self.f5 = bigsuds.BIGIP(
             hostname=host,
             username=user,
             password=passwd
         )
+        self._interfaces = dict()
+        self._reply_size = None
         self.plist = None
         self.pstatus = None
         self.pmembers = None
@@ -183,6 +830,54 @@ class F5Client():
         self.vpools = None
         self.vstats = None
 
+    def interface(self, name):
+        """
+        Returns the bigsuds client of an iControl interface, its first use loads the interface WSDL
+        :param name: interface name, LocalLB.Pool
+        :type name: str
+        :return: bigsuds client
+        """
+        if name not in self._interfaces:
+            namespace, attr = name.split('.')
+            with self.timings.span('wsdl %s' % name):
+                client = getattr(getattr(self.f5, namespace), attr)
+            suds_client = getattr(client, '_client', None)
+            if suds_client is not None:
+                if self._reply_size is None:
+                    self._reply_size = reply_size_plugin()
+                suds_client.set_options(plugins=[self._reply_size])
+            self._interfaces[name] = client
+        return self._interfaces[name]
+
+    def call(self, interface, method, *args):
+        """
+        Calls an iControl method, adding its duration and reply size, or an error, to the span interface.method
+        :param interface: interface name, LocalLB.Pool
+        :type interface: str
+        :param method: method name
+        :type method: str
+        :return: method result
+        """
+        client = self.interface(interface)
+        name = '%s.%s' % (interface, method)
+        _replies.size = 0
+        start = time.time()
+        try:
+            result = getattr(client, method)(*args)
+        except Exception as e:
+            elapsed = time.time() - start
+            self.timings.add(name, elapsed, errors=1)
+            metrics.observe('icontrol_call_seconds', elapsed, device=self.host, method=name)
+            metrics.inc('icontrol_errors', device=self.host, method=name)
+            if isinstance(e, socket.timeout) or 'timed out' in str(e):
+                metrics.inc('icontrol_timeouts', device=self.host, method=name)
+            raise
+        elapsed = time.time() - start
+        self.timings.add(name, elapsed, bytes=_replies.size)
+        metrics.observe('icontrol_call_seconds', elapsed, device=self.host, method=name)
+        metrics.inc('icontrol_bytes', _replies.size, device=self.host, method=name)
+        return result
+
     def set_partition(self, partition):
         """
         Set active partition for methods.
@@ -190,10 +885,10 @@ class F5Client():
         :type partition: str
         :return: str
         """
-        activeparition = self.f5.Management.Partition.get_active_partition()
+        activeparition = self.call('Management.Partition', 'get_active_partition')
         if partition != activeparition:
-            self.f5.Management.Partition.set_active_partition(partition)
-        return self.f5.Management.Partition.get_active_partition()
+            self.call('Management.Partition', 'set_active_partition', partition)
+        return self.call('Management.Partition', 'get_active_partition')
 
     def pool_list(self, pools=None):
         """
@@ -202,7 +897,7 @@ class F5Client():
         :type pools: string
         :return: list
         """
-        self.plist = pools.split(',') if pools else self.f5.LocalLB.Pool.get_list()
+        self.plist = pools.split(',') if pools else self.call('LocalLB.Pool', 'get_list')
 
     def pool_status(self, pools=None):
         """
@@ -213,7 +908,7 @@ class F5Client():
         """
         pools = pools if pools else self.plist
         if pools:
-            self.pstatus = self.f5.LocalLB.Pool.get_object_status(pools)
+            self.pstatus = self.call('LocalLB.Pool', 'get_object_status', pools)
 
     def pool_members(self, pools=None):
         """
@@ -224,7 +919,7 @@ class F5Client():
         """
         pools = pools if pools else self.plist
         if pools:
-            self.pmembers = self.f5.LocalLB.Pool.get_member_v2(pools)
+            self.pmembers = self.call('LocalLB.Pool', 'get_member_v2', pools)
 
     def pool_member_status(self, pools=None):
         """
@@ -235,7 +930,7 @@ class F5Client():
         """
         pools = pools if pools else self.plist
         if pools:
-            self.pmember_status = self.f5.LocalLB.PoolMember.get_object_status(pools)
+            self.pmember_status = self.call('LocalLB.PoolMember', 'get_object_status', pools)
 
     def pool_member_stats(self, pools=None):
         """
@@ -246,7 +941,7 @@ class F5Client():
         """
         pools = pools if pools else self.plist
         if pools:
-            self.pmember_stats = self.f5.LocalLB.Pool.get_all_member_statistics(pools)
+            self.pmember_stats = self.call('LocalLB.Pool', 'get_all_member_statistics', pools)
 
     def vserver_list(self, vservers=None):
         """
@@ -255,7 +950,7 @@ class F5Client():
         :type vservers: string
         :return: list
         """
-        self.vlist = vservers.split(',') if vservers else self.f5.LocalLB.VirtualServer.get_list()
+        self.vlist = vservers.split(',') if vservers else self.call('LocalLB.VirtualServer', 'get_list')
 
     def vserver_dest(self, vservers=None):
         """
@@ -266,7 +961,7 @@ class F5Client():
         """
         vservers = vservers if vservers else self.vlist
         if vservers:
-            self.vdests = self.f5.LocalLB.VirtualServer.get_destination_v2(vservers)
+            self.vdests = self.call('LocalLB.VirtualServer', 'get_destination_v2', vservers)
 
     def vserver_pool(self, vservers=None):
         """
@@ -277,7 +972,7 @@ class F5Client():
         """
         vservers = vservers if vservers else self.vlist
         if vservers:
-            self.vpools = self.f5.LocalLB.VirtualServer.get_default_pool_name(vservers)
+            self.vpools = self.call('LocalLB.VirtualServer', 'get_default_pool_name', vservers)
 
     def vserver_stats(self, vservers=None):
         """
@@ -288,9 +983,42 @@ class F5Client():
         """
         vservers = vservers if vservers else self.vlist
         if vservers:
-            self.vstats = self.f5.LocalLB.VirtualServer.get_statistics(vservers)
+            self.vstats = self.call('LocalLB.VirtualServer', 'get_statistics', vservers)
+
+    def pools_fieldnames(self, raw='pretty'):
+        """
+        Returns every field pools_output yields, including statistics seen on any member
+        :param raw: _raw layout, false, compact or pretty
+        :type raw: str
+        :return: list
+        """
+        if self.pmembers:
+            fieldnames = ['_time', 'pool_partition', 'pool_name', 'pool_member']
+            if self.pmember_status:
+                fieldnames.extend(['pool_member_address', 'pool_member_port', 'pool_member_availability_status',
+                                   'pool_member_enabled_status'])
+            if self.pmember_stats:
+                seen = set()
+                for pool_stats in self.pmember_stats:
+                    for member_stats in pool_stats['statistics']:
+                        for stats in member_stats['statistics']:
+                            if stats['type'] not in seen:
+                                seen.add(stats['type'])
+                                fieldnames.append(stats['type'].replace('STATISTIC_', 'pool_member_').lower())
+            fieldnames.extend(['pool_availability_status', 'pool_enabled_status'])
+        else:
+            fieldnames = ['_time', 'partition', 'pool_name', 'pool_availability_status', 'pool_enabled_status']
+        if raw != 'false':
+            fieldnames.append('_raw')
+        return fieldnames
 
-    def pools_output(self, members=None, membersstatuses=None, poolstatistics=None):
+    def pools_output(self, raw='pretty'):
+        """
+        Yields pool and pool member records
+        :param raw: _raw layout, false, compact or pretty
+        :type raw: str
+        :return: generator
+        """
         timestamp = time.time()
         timeoffset = (time.mktime(time.localtime()) - time.mktime(time.gmtime()))
         for n, pool in enumerate(self.plist):
@@ -318,7 +1046,10 @@ class F5Client():
                             poolinfo['_time'] = time.mktime(time_struct) + timeoffset
                     poolinfo['pool_availability_status'] = self.pstatus[n]['availability_status']
                     poolinfo['pool_enabled_status'] = self.pstatus[n]['enabled_status']
-                    poolinfo['_raw'] = tojson(poolinfo)
+                    if raw != 'false':
+                        start = time.time()
+                        poolinfo['_raw'] = tojson(poolinfo, raw)
+                        self.timings.add('tojson', time.time() - start)
                     yield poolinfo
             else:
                 poolinfo = dict()
@@ -327,10 +1058,40 @@ class F5Client():
                 poolinfo['pool_name'] = pool
                 poolinfo['pool_availability_status'] = self.pstatus[n]['availability_status']
                 poolinfo['pool_enabled_status'] = self.pstatus[n]['enabled_status']
-                poolinfo['_raw'] = tojson(poolinfo)
+                if raw != 'false':
+                    start = time.time()
+                    poolinfo['_raw'] = tojson(poolinfo, raw)
+                    self.timings.add('tojson', time.time() - start)
                 yield poolinfo
 
-    def vserver_output(self):
+    def vserver_fieldnames(self, raw='pretty'):
+        """
+        Returns every field vserver_output yields, including statistics seen on any virtual server
+        :param raw: _raw layout, false, compact or pretty
+        :type raw: str
+        :return: list
+        """
+        fieldnames = ['_time', 'pool_partition', 'pool_name', 'virtual_server_name', 'virtual_address',
+                      'virtual_server_partition']
+        if self.vstats:
+            fieldnames.extend(['virtual_sever_protocol', 'virtual_sever_port'])
+            seen = set()
+            for vserver_stats in self.vstats['statistics']:
+                for stats in vserver_stats['statistics']:
+                    if stats['type'] not in seen:
+                        seen.add(stats['type'])
+                        fieldnames.append(stats['type'].replace('STATISTIC_', 'virtual_server_').lower())
+        if raw != 'false':
+            fieldnames.append('_raw')
+        return fieldnames
+
+    def vserver_output(self, raw='pretty'):
+        """
+        Yields virtual server records
+        :param raw: _raw layout, false, compact or pretty
+        :type raw: str
+        :return: generator
+        """
         timestamp = time.time()
         timeoffset = (time.mktime(time.localtime()) - time.mktime(time.gmtime()))
         if self.vlist:
@@ -359,7 +1120,10 @@ class F5Client():
                             stats['value']['high'],
                             stats['value']['low'])
 
-                vserverinfo['_raw'] = tojson(vserverinfo)
+                if raw != 'false':
+                    start = time.time()
+                    vserverinfo['_raw'] = tojson(vserverinfo, raw)
+                    self.timings.add('tojson', time.time() - start)
                 yield vserverinfo
 
 @Configuration()
@@ -416,21 +1180,52 @@ class f5QueryCommand(GeneratingCommand):
          **Description:** IP Address or Full Qualified Domain Name (FQDN)''',
         require=True)
 
+    raw = Option(
+        doc='''**Syntax:** **raw=***false|compact|pretty*
+         **Description:** Layout of the _raw field. false omits _raw, use when only fields are needed.
+         Defaults to pretty ''',
+        require=False, default='pretty', validate=validators.Set('false', 'compact', 'pretty'))
+
+    debug = Option(
+        doc='''**Syntax:** **debug=***<boolean>*
+         **Description:** Report the time taken by each phase and iControl call in the search messages.
+         Timings are always written to f5query.log. Defaults to false ''',
+        require=False, default=False, validate=validators.Boolean())
+
+    profile = Option(
+        doc='''**Syntax:** **profile=***cpu|memory*
+         **Description:** Profile this run with cProfile, or its memory, and write the dump to
+         $SPLUNK_HOME/var/run/f5query/profiles ''',
+        require=False, validate=validators.Set('cpu', 'memory'))
+
+    def namespace(self):
+        """
+        Returns the user and app of the search, those self.service reads storage/passwords as
+        :return: tuple
+        """
+        info = self.search_results_info
+        return getattr(info, 'ppc_user', None), getattr(info, 'ppc_app', None)
 
     def generate(self):
+        setup_logger(logging.INFO)
+        timings = Timings()
         try:
-            conf = get_stanza('f5query', 'f5query')
-            user = conf['user']
-            password = conf['password']
+            with timings.span('credentials'):
+                conf = get_device_stanza('f5query', 'f5query', self.device)
+                user, password = get_credentials(lambda: self.service, self.device, conf, self.namespace())
+            profiler = Profiler.sample(self.profile, conf)
 
             f5 = F5Client(user,
                           password,
-                          self.device)
+                          self.device,
+                          timings)
         except Exception as e:
-            self.logger.debug('f5QueryCommand: %s, %s' % e, self)
+            self.logger.debug('f5QueryCommand: %s, %s' % (e, self))
+            metrics.inc('search_errors', device=self.device)
+            flush_metrics()
             exit(1)
         # Creating threading object
-        f5threads = Worker()
+        f5threads = Worker(profiler.wrap if profiler else None)
 
         # F5 virtual server
         if self.vservers:
@@ -462,17 +1257,50 @@ class f5QueryCommand(GeneratingCommand):
         for thread in f5threads.jobs:
             thread.join()
 
-        if self.pools:
-            for pool in f5.pools_output():
-                pool['source'] = 'f5'
-                pool['sourcetype'] = 'icontrol'
-                yield pool
+        # the messages header goes out with the first record under the legacy protocol, totals are only added
+        # under the chunked protocol, whose chunks carry messages until the end
+        if self.debug:
+            self.messages.append('info_message', 'f5query %s requests: %s' % (self.device, timings.summary()))
 
-        # if self.virtualServer is define get virtual Server information
+        # declaring output fields up front so fields of later records are not dropped from the output header
+        fieldnames = list()
+        if self.pools:
+            fieldnames.extend(f5.pools_fieldnames(self.raw))
         if self.vservers:
-            for vserver in f5.vserver_output():
-                vserver['source'] = 'f5'
-                vserver['sourcetype'] = 'icontrol'
-                yield vserver
+            fieldnames.extend(f5.vserver_fieldnames(self.raw))
+        fieldnames.extend(['source', 'sourcetype'])
+        seen = set()
+        self.output_fieldnames = [name for name in fieldnames if not (name in seen or seen.add(name))]
+
+        try:
+            if self.pools:
+                for pool in timed(f5.pools_output(self.raw), timings, 'pools_output'):
+                    pool['source'] = 'f5'
+                    pool['sourcetype'] = 'icontrol'
+                    yield pool
+
+            # if self.virtualServer is define get virtual Server information
+            if self.vservers:
+                for vserver in timed(f5.vserver_output(self.raw), timings, 'vserver_output'):
+                    vserver['source'] = 'f5'
+                    vserver['sourcetype'] = 'icontrol'
+                    yield vserver
+        finally:
+            timings.log(self.device)
+            metrics.inc('searches', device=self.device)
+            for name in ('pools_output', 'vserver_output'):
+                if name in timings.spans:
+                    metrics.inc('records', timings.spans[name].get('records', 0), device=self.device,
+                                output=name)
+            flush_metrics()
+            # under the legacy protocol the totals are in the timings logged above only
+            if self.debug and self.protocol_version == 2:
+                self.messages.append('info_message', 'f5query %s totals: %s' % (self.device, timings.summary()))
+            if profiler:
+                try:
+                    path = profiler.stop(PROFILE_DIR, int(conf.get('profile_keep', PROFILE_KEEP)))
+                    logger.info('profile %s written to %s' % (profiler.mode, path))
+                except Exception as e:
+                    logger.warning('unable to write %s profile: %s' % (profiler.mode, e))
 
 dispatch(f5QueryCommand, sys.argv, sys.stdin, sys.stdout, __name__)
\ No newline at end of file
@@ -0,0 +1,76 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import time
+from splunklib.searchcommands import \
+    dispatch, GeneratingCommand, Configuration, Option, validators
+from f5query import METRICS_PATH, read_metrics, histogram_quantile
+
+
+@Configuration()
+class f5QueryStatsCommand(GeneratingCommand):
+    """ %(synopsis)
+
+    ##Syntax
+
+    .. code-block::
+    f5querystats window=<duration>
+
+    ##Description
+
+    Returns the metrics f5query runs on this search head flushed to $SPLUNK_HOME/var/run/f5query/metrics.jsonl,
+    one result per metric and labels. Counters have a value, iControl call latency histograms a count, sum, average
+    and the upper bounds of the buckets holding the 50th, 90th and 99th percentiles.
+
+    ##Example
+
+    iControl call latency by device and method over the last hour.
+
+    .. code-block::
+        | f5querystats window=01:00:00 | search metric=icontrol_call_seconds | table device method count avg p90
+
+    """
+
+    window = Option(
+        doc='''**Syntax:** **window=***<duration>*
+         **Description:** Only count metrics flushed within this duration, [[HH:]MM:]SS. Defaults to all ''',
+        require=False, validate=validators.Duration())
+
+    def generate(self):
+        since = time.time() - self.window if self.window else 0
+        counters, histograms, last = read_metrics(METRICS_PATH, since) if METRICS_PATH else ({}, {}, None)
+        records = list()
+        for (name, labels), value in sorted(counters.items()):
+            record = dict(labels)
+            record.update({'_time': last, 'metric': name, 'value': value})
+            records.append(record)
+        for (name, labels), (buckets, total) in sorted(histograms.items()):
+            count = sum(buckets)
+            record = dict(labels)
+            record.update({'_time': last, 'metric': name, 'count': count, 'sum': round(total, 6),
+                           'avg': round(total / count, 6) if count else None,
+                           'p50': histogram_quantile(buckets, 0.5), 'p90': histogram_quantile(buckets, 0.9),
+                           'p99': histogram_quantile(buckets, 0.99)})
+            records.append(record)
+
+        # declaring output fields up front so that labels of later records are not dropped from the output header
+        fieldnames = ['_time', 'metric']
+        for record in records:
+            fieldnames.extend(name for name in sorted(record) if name not in fieldnames)
+        self.output_fieldnames = fieldnames
+        for record in records:
+            yield record
+
+dispatch(f5QueryStatsCommand, sys.argv, sys.stdin, sys.stdout, __name__)
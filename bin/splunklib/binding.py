@@ -1124,7 +1124,7 @@ class ResponseReader(io.RawIOBase):
     # will work equally well.
     def __init__(self, response):
         self._response = response
-        self._buffer = ''
+        self._buffer = bytearray()  # Characters peeked, but not yet read
 
     def __str__(self):
         return self.read()
@@ -1143,9 +1143,9 @@ class ResponseReader(io.RawIOBase):
         :param size: The number of characters to retrieve.
         :type size: ``integer``
         """
-        c = self.read(size)
-        self._buffer = self._buffer + c
-        return c
+        if len(self._buffer) < size:
+            self._buffer.extend(self._response.read(size - len(self._buffer)))
+        return str(self._buffer[:size])
 
     def close(self):
         """Closes this response."""
@@ -1159,11 +1159,17 @@ class ResponseReader(io.RawIOBase):
         :type size: ``integer`` or "None"
 
         """
-        r = self._buffer
-        self._buffer = ''
-        if size is not None:
-            size -= len(r)
-        r = r + self._response.read(size)
+        if len(self._buffer) == 0:
+            return self._response.read() if size is None else self._response.read(size)
+        if size is None:
+            r = str(self._buffer) + self._response.read()
+            del self._buffer[:]
+        elif size <= len(self._buffer):
+            r = str(self._buffer[:size])
+            del self._buffer[:size]
+        else:
+            r = str(self._buffer) + self._response.read(size - len(self._buffer))
+            del self._buffer[:]
         return r
 
     def readable(self):
@@ -1173,14 +1179,27 @@ class ResponseReader(io.RawIOBase):
     def readinto(self, byte_array):
         """ Read data into a byte array, upto the size of the byte array.
 
+        Peeked characters are copied first. The rest is read directly into
+        ``byte_array`` when the response supports ``readinto``.
+
         :param byte_array: A byte array/memory view to pour bytes into.
         :type byte_array: ``bytearray`` or ``memoryview``
 
         """
-        max_size = len(byte_array)
-        data = self.read(max_size)
-        bytes_read = len(data)
-        byte_array[:bytes_read] = data
+        view = memoryview(byte_array)
+        max_size = len(view)
+        bytes_read = min(len(self._buffer), max_size)
+        if bytes_read > 0:
+            view[:bytes_read] = self._buffer[:bytes_read]
+            del self._buffer[:bytes_read]
+        if bytes_read < max_size:
+            readinto = getattr(self._response, 'readinto', None)
+            if readinto is not None:
+                bytes_read += readinto(view[bytes_read:]) or 0
+            else:
+                data = self._response.read(max_size - bytes_read)
+                view[bytes_read:bytes_read + len(data)] = data
+                bytes_read += len(data)
         return bytes_read
 
 
@@ -62,10 +62,14 @@ import datetime
 import json
 import urllib
 import logging
-from time import sleep
+from time import sleep, time
 from datetime import datetime, timedelta
+from collections import deque
+import Queue
 import socket
 import contextlib
+import sys
+import threading
 
 from binding import Context, HTTPError, AuthenticationError, namespace, UrlEncoded, _encode
 from data import record
@@ -77,6 +81,7 @@ __all__ = [
     "OperationError",
     "IncomparableException",
     "Service",
+    "EntityCache",
     "namespace"
 ]
 
@@ -191,6 +196,95 @@ def _path(base, name):
     return base + name
 
 
+class EntityCache(object):
+    """A cache of entity state records shared by the entities of one
+    :class:`Service`.
+
+    States are stored under the absolute path of their entity as they are
+    loaded, either by a collection listing or by a GET of the entity itself,
+    and expire *ttl* seconds later. A listing therefore hydrates the states of
+    all its entities with a single request. Collections also store the state
+    they found by a name lookup in their service's namespace apart, under the
+    path looked up, as that namespace may see more than one entity of the name.
+    Every POST and DELETE the service makes invalidates the states of the
+    entities at, above or below its path, in every namespace.
+
+    Enable the cache by passing ``entity_cache_ttl`` to :class:`Service` or
+    :func:`connect`.
+
+    :param ttl: The number of seconds a cached state is used for.
+    :type ttl: ``float``
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._states = {}   # (path, lookup) -> (expires, state)
+
+    def __len__(self):
+        return len(self._states)
+
+    # Entity paths are looked up without a trailing slash.
+    @staticmethod
+    def _key(path):
+        return path.rstrip('/')
+
+    # The path of an entity without its /services or /servicesNS/owner/app
+    # prefix, as a collection path plus a name.
+    @staticmethod
+    def _relative(path):
+        segments = path.split('/', 4)
+        if len(segments) > 2 and segments[1] == 'services':
+            return path.split('/', 2)[2]
+        if len(segments) > 4 and segments[1] == 'servicesNS':
+            return segments[4]
+        return path
+
+    def clear(self):
+        """Removes all states from the cache."""
+        with self._lock:
+            self._states.clear()
+
+    def get(self, path, lookup=False):
+        """Returns the state cached for the entity at the absolute *path*, or
+        ``None`` if there is none or it has expired.
+
+        If *lookup* is ``True``, returns the state cached for a name lookup of
+        *path* instead.
+        """
+        key = (self._key(path), lookup)
+        item = self._states.get(key)
+        if item is None:
+            return None
+        if item[0] < time():
+            with self._lock:
+                if self._states.get(key) is item:
+                    del self._states[key]
+            return None
+        return item[1]
+
+    def invalidate(self, path):
+        """Removes the states of the entities at *path*, of the entities whose
+        paths start with it, such as the entities of a collection, and of the
+        entity it is a path below, such as ``<entity>/disable``.
+
+        The namespace of *path* is not compared, a change made in one namespace
+        may be seen through another and wildcard namespaces match any.
+        """
+        relative = self._relative(self._key(path))
+        with self._lock:
+            for key in list(self._states):
+                other = self._relative(key[0])
+                if other == relative or other.startswith(relative + '/') or relative.startswith(other + '/'):
+                    del self._states[key]
+
+    def put(self, path, state, lookup=False):
+        """Caches *state* for the entity at the absolute *path*, or for a name
+        lookup of *path* if *lookup* is ``True``.
+        """
+        with self._lock:
+            self._states[(self._key(path), lookup)] = (time() + self.ttl, state)
+
+
 # Load an atom record from the body of the given response
 def _load_atom(response, match=None):
     return data.load(response.body.read(), match)
@@ -216,6 +310,12 @@ def _load_atom_entries(response):
         return entries if isinstance(entries, list) else [entries]
 
 
+# Incrementally load the atom entries from the body of the given response
+def _iter_atom_entries(response):
+    for item in data.iterload(response.body):
+        yield item.entry
+
+
 # Load the sid from the body of the given response
 def _load_sid(response):
     return _load_atom(response).response.sid
@@ -293,6 +393,9 @@ def connect(**kwargs):
     :type username: ``string``
     :param `password`: The password for the Splunk account.
     :type password: ``string``
+    :param `entity_cache_ttl`: The number of seconds entity states are cached
+                               for (optional). See :class:`EntityCache`.
+    :type entity_cache_ttl: ``float``
     :return: An initialized :class:`Service` connection.
 
     **Example**::
@@ -351,6 +454,10 @@ class Service(_BaseService):
     :param `password`: The password, which is used to authenticate the Splunk
                        instance.
     :type password: ``string``
+    :param `entity_cache_ttl`: The number of seconds entity states are cached
+                               for (optional). By default entity states are not
+                               shared between entities. See :class:`EntityCache`.
+    :type entity_cache_ttl: ``float``
     :return: A :class:`Service` instance.
 
     **Example**::
@@ -364,8 +471,29 @@ class Service(_BaseService):
         s = client.Service(token="atg232342aa34324a")
     """
     def __init__(self, **kwargs):
+        entity_cache_ttl = kwargs.pop('entity_cache_ttl', None)
         super(Service, self).__init__(**kwargs)
         self._splunk_version = None
+        self.entity_cache = None if entity_cache_ttl is None else EntityCache(entity_cache_ttl)
+
+    def delete(self, path_segment, owner=None, app=None, sharing=None, **query):
+        try:
+            return super(Service, self).delete(path_segment, owner=owner, app=app, sharing=sharing, **query)
+        finally:
+            self._invalidate(path_segment, owner, app, sharing)
+
+    def post(self, path_segment, owner=None, app=None, sharing=None, headers=None, **query):
+        try:
+            return super(Service, self).post(path_segment, owner=owner, app=app, sharing=sharing, headers=headers,
+                                             **query)
+        finally:
+            self._invalidate(path_segment, owner, app, sharing)
+
+    def _invalidate(self, path_segment, owner, app, sharing):
+        # Drops cached entity states a POST or DELETE of path_segment may have
+        # changed, also when the request failed part way.
+        if self.entity_cache is not None:
+            self.entity_cache.invalidate(self._abspath(path_segment, owner=owner, app=app, sharing=sharing))
 
     @property
     def apps(self):
@@ -836,6 +964,11 @@ class Entity(Endpoint):
     # optional fields. See above.
     defaults = {}
 
+    # Whether the state of this kind of entity may be served from the
+    # service's entity cache. Entities whose state changes on its own, such
+    # as search jobs, turn this off.
+    cacheable = True
+
     def __init__(self, service, path, **kwargs):
         Endpoint.__init__(self, service, path)
         self._state = None
@@ -943,6 +1076,15 @@ class Entity(Endpoint):
         else:
             return (owner,app,sharing)
 
+    def _cache(self):
+        # The service's entity cache and the key of this entity in it, or
+        # (None, None) if the state of this entity is not cached.
+        cache = self.service.entity_cache if self.cacheable else None
+        if cache is None:
+            return None, None
+        owner, app, sharing = self._proper_namespace()
+        return cache, self.service._abspath(self.path, owner=owner, app=app, sharing=sharing)
+
     def delete(self):
         owner, app, sharing = self._proper_namespace()
         return self.service.delete(self.path, owner=owner, app=app, sharing=sharing)
@@ -980,6 +1122,8 @@ class Entity(Endpoint):
             self._state = state
         else:
             self._state = self.read(self.get())
+        cache, path = self._cache()
+        if cache is not None: cache.put(path, self._state)
         return self
 
     @property
@@ -1059,7 +1203,10 @@ class Entity(Endpoint):
 
         :return: A ``dict`` containing fields and metadata for the entity.
         """
-        if self._state is None: self.refresh()
+        if self._state is None:
+            cache, path = self._cache()
+            if cache is not None: self._state = cache.get(path)
+            if self._state is None: self.refresh()
         return self._state
 
     def update(self, **kwargs):
@@ -1143,6 +1290,9 @@ class ReadOnlyCollection(Endpoint):
         This function makes a single roundtrip to the server, plus at
         most two additional round trips if
         the ``autologin`` field of :func:`connect` is set to ``True``.
+        If the service has an entity cache holding the state of the entity at
+        *key* in the service's namespace, which must not contain wildcards, no
+        roundtrip is made.
 
         :param key: The name to fetch, or a tuple (name, namespace).
         :return: An :class:`Entity` object.
@@ -1180,6 +1330,9 @@ class ReadOnlyCollection(Endpoint):
                 response = self.get(key, owner=ns.owner, app=ns.app)
             else:
                 key = UrlEncoded(key, encode_slash=True)
+                entity = self._cached_item(key)
+                if entity is not None:
+                    return entity
                 response = self.get(key)
             entries = self._load_list(response)
             if len(entries) > 1:
@@ -1187,6 +1340,8 @@ class ReadOnlyCollection(Endpoint):
             elif len(entries) == 0:
                 raise KeyError(key)
             else:
+                if not isinstance(key, tuple):
+                    self._cache_item(key, entries[0])
                 return entries[0]
         except HTTPError as he:
             if he.status == 404: # No entity matching key and namespace.
@@ -1238,6 +1393,35 @@ class ReadOnlyCollection(Endpoint):
         """
         return len(self.list())
 
+    def _item_cache_path(self, name):
+        # Returns the service's entity cache and the absolute path of the
+        # entity called *name* in the service's namespace, or (None, None) if
+        # the cache is off or the namespace has wildcards, as then only splunkd
+        # can tell whether the name is unique.
+        cache = self.service.entity_cache
+        if cache is None or not self.item.cacheable:
+            return None, None
+        path = self.service._abspath(_path(self.path, name))
+        segments = path.split('/', 4)
+        if len(segments) < 5 or segments[1] != 'servicesNS' or '-' in segments[2:4]:
+            return None, None
+        return cache, path
+
+    def _cached_item(self, name):
+        # Returns the entity called *name* in the service's namespace from the
+        # service's entity cache, or None.
+        cache, path = self._item_cache_path(name)
+        state = None if cache is None else cache.get(path, lookup=True)
+        if state is None:
+            return None
+        return self.item(self.service, self._entity_path(state), state=state)
+
+    def _cache_item(self, name, entity):
+        # Caches the state of *entity* under the path it was looked up by.
+        cache, path = self._item_cache_path(name)
+        if cache is not None and entity._state is not None:
+            cache.put(path, entity._state, lookup=True)
+
     def _entity_path(self, state):
         """Calculate the path to an entity to be returned.
 
@@ -1282,21 +1466,24 @@ class ReadOnlyCollection(Endpoint):
         that is, an XML document with a toplevel element ``<feed>``,
         and within that element one or more ``<entry>`` elements.
         """
+        return list(self._iter_list(response))
+
+    def _iter_list(self, response):
+        """Converts *response* to entities one ``<entry>`` at a time.
+
+        This is the incremental form of :meth:`_load_list`: each entity is
+        yielded as soon as its entry has been read from the response body, and
+        the parsed entry is discarded before the next one is read.
+        """
         # Some subclasses of Collection have to override this because
         # splunkd returns something that doesn't match
         # <feed><entry></entry><feed>.
-        entries = _load_atom_entries(response)
-        if entries is None: return []
-        entities = []
-        for entry in entries:
+        for entry in _iter_atom_entries(response):
             state = _parse_atom_entry(entry)
-            entity = self.item(
+            yield self.item(
                 self.service,
                 self._entity_path(state),
                 state=state)
-            entities.append(entity)
-
-        return entities
 
     def itemmeta(self):
         """Returns metadata for members of the collection.
@@ -1337,7 +1524,7 @@ class ReadOnlyCollection(Endpoint):
         content = _load_atom(response, MATCH_ENTRY_CONTENT)
         return _parse_atom_metadata(content)
 
-    def iter(self, offset=0, count=None, pagesize=None, **kwargs):
+    def iter(self, offset=0, count=None, pagesize=None, prefetch=None, **kwargs):
         """Iterates over the collection.
 
         This method is equivalent to the :meth:`list` method, but
@@ -1350,6 +1537,10 @@ class ReadOnlyCollection(Endpoint):
         :type count: ``integer``
         :param pagesize: The number of entities to load (optional).
         :type pagesize: ``integer``
+        :param prefetch: The number of pages to keep in flight while earlier
+            pages are consumed (optional). Pages are fetched by as many
+            threads. Requires *pagesize*.
+        :type prefetch: ``integer``
         :param kwargs: Additional arguments (optional):
 
             - "search" (``string``): The search query to filter responses.
@@ -1372,23 +1563,85 @@ class ReadOnlyCollection(Endpoint):
                 # Loads 10 saved searches at a time from the
                 # server.
                 ...
+            for saved_search in s.saved_searches.iter(pagesize=100, prefetch=4):
+                # Loads up to 4 pages of 100 saved searches concurrently,
+                # in order.
+                ...
         """
         assert pagesize is None or pagesize > 0
+        assert prefetch is None or (prefetch > 0 and pagesize is not None)
         if count is None:
             count = self.null_count
+        if prefetch is not None:
+            for item in self._iter_prefetched(offset, count, pagesize, prefetch, kwargs):
+                yield item
+            return
         fetched = 0
         while count == self.null_count or fetched < count:
             response = self.get(count=pagesize or count, offset=offset, **kwargs)
-            items = self._load_list(response)
-            N = len(items)
-            fetched += N
-            for item in items:
+            N = 0
+            for item in self._iter_list(response):
+                N += 1
                 yield item
+            fetched += N
             if pagesize is None or N < pagesize:
                 break
             offset += N
             logging.debug("pagesize=%d, fetched=%d, offset=%d, N=%d, kwargs=%s", pagesize, fetched, offset, N, kwargs)
 
+    def _iter_prefetched(self, offset, count, pagesize, prefetch, kwargs):
+        # Pages are requested in offset order by a pool of *prefetch* threads
+        # and consumed in that order. A page is only requested when an earlier
+        # one has been consumed, so at most *prefetch* pages are held at once.
+        requests = Queue.Queue()
+        pending = deque()
+        limit = None if count == self.null_count else offset + count
+
+        def fetch():
+            while True:
+                page = requests.get()
+                if page is None:
+                    return
+                try:
+                    response = self.get(count=pagesize, offset=page['offset'], **kwargs)
+                    page['items'] = self._load_list(response)
+                except BaseException:
+                    page['error'] = sys.exc_info()
+                page['done'].set()
+
+        def request(page_offset):
+            page = {'offset': page_offset, 'done': threading.Event()}
+            pending.append(page)
+            requests.put(page)
+
+        workers = [threading.Thread(target=fetch) for i in range(prefetch)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        try:
+            next_offset = offset
+            while len(pending) < prefetch and (limit is None or next_offset < limit):
+                request(next_offset)
+                next_offset += pagesize
+            while len(pending) > 0:
+                page = pending.popleft()
+                page['done'].wait()
+                if 'error' in page:
+                    raise page['error'][0], page['error'][1], page['error'][2]
+                items = page['items']
+                logging.debug("pagesize=%d, offset=%d, N=%d, kwargs=%s", pagesize, page['offset'], len(items), kwargs)
+                for item in items:
+                    yield item
+                if len(items) < pagesize:
+                    break
+                if limit is None or next_offset < limit:
+                    request(next_offset)
+                    next_offset += pagesize
+        finally:
+            for worker in workers:
+                requests.put(None)
+
     # kwargs: count, offset, search, sort_dir, sort_key, sort_mode
     def list(self, count=None, **kwargs):
         """Retrieves a list of entities in this collection.
@@ -2567,6 +2820,8 @@ class Inputs(Collection):
 
 class Job(Entity):
     """This class represents a search job."""
+    cacheable = False
+
     def __init__(self, service, sid, **kwargs):
         path = PATH_JOBS + sid
         Entity.__init__(self, service, path, skip_refresh=True, **kwargs)
@@ -2848,19 +3103,14 @@ class Jobs(Collection):
         # Collection is 0, not -1 as it is on most.
         self.null_count = 0
 
-    def _load_list(self, response):
+    def _iter_list(self, response):
         # Overridden because Job takes a sid instead of a path.
-        entries = _load_atom_entries(response)
-        if entries is None: return []
-        entities = []
-        for entry in entries:
+        for entry in _iter_atom_entries(response):
             state = _parse_atom_entry(entry)
-            entity = self.item(
+            yield self.item(
                 self.service,
                 entry['content']['sid'],
                 state=state)
-            entities.append(entity)
-        return entities
 
     def create(self, query, **kwargs):
         """ Creates a search using a search query and any additional parameters
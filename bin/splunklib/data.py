@@ -18,7 +18,12 @@ format, which is the format used by most of the REST API.
 
 from xml.etree.ElementTree import XML
 
-__all__ = ["load"]
+try:
+    from xml.etree.cElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+__all__ = ["load", "iterload"]
 
 # LNAME refers to element names without namespaces; XNAME is the same
 # name, but with an XML namespace.
@@ -53,7 +58,9 @@ def hasattrs(element):
 
 def localname(xname):
     rcurly = xname.find('}')
-    return xname if rcurly == -1 else xname[rcurly+1:]
+    if rcurly == -1: return xname
+    name = xname[rcurly+1:]
+    return intern(name) if type(name) is str else name
 
 def load(text, match=None):
     """This function reads a string that contains the XML of an Atom Feed, then 
@@ -84,23 +91,68 @@ def load(text, match=None):
     else:
         return [load_root(item, nametable) for item in items]
 
+def iterload(stream, match="entry"):
+    """This function incrementally reads a stream that contains the XML of an
+    Atom Feed and yields each element whose local name is *match* as soon as
+    its end tag has been parsed. Each element is loaded exactly as :func:`load`
+    loads a matching element, and is then discarded, so only one element is
+    held in memory at a time.
+
+    Elements nested inside a matching element are not matched separately.
+
+    :param stream: A stream implementing ``read`` that contains the XML to load.
+    :type stream: ``file``
+    :param match: The local name of the elements to load (optional).
+    :type match: ``string``
+    """
+    if stream is None: return
+    nametable = {
+        'namespaces': [],
+        'names': {}
+    }
+    parents = []
+    depth = 0
+    events = iterparse(stream, events=("start", "end"))
+    try:
+        for event, element in events:
+            if event == "start":
+                if depth > 0 or localname(element.tag) == match:
+                    depth += 1
+                else:
+                    parents.append(element)
+                continue
+            if depth == 0:
+                parents.pop()
+                continue
+            depth -= 1
+            if depth > 0:
+                continue
+            item = load_root(element, nametable)
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+            yield item
+    except SyntaxError:
+        # An empty body is not an error, just as it is not for load.
+        if parents or depth > 0: raise
+
 # Load the attributes of the given element.
 def load_attrs(element):
     if not hasattrs(element): return None
-    attrs = record()
-    for key, value in element.attrib.iteritems(): 
-        attrs[key] = value
-    return attrs
+    return record(element.attrib)
 
-# Parse a <dict> element and return a Python dict
+# Parse a <dict> element and return a Python dict. Items are collected in a
+# dict first, as setting them on a Record one by one is slower. Key names are
+# interned, so that the entities of a feed share one copy of each.
 def load_dict(element, nametable = None):
-    value = record()
+    value = {}
     children = list(element)
     for child in children:
         assert iskey(child.tag)
         name = child.attrib["name"]
+        if type(name) is str: name = intern(name)
         value[name] = load_value(child, nametable)
-    return value
+    return record(value)
 
 # Loads the given elements attrs & value into single merged dict.
 def load_elem(element, nametable=None):
@@ -165,7 +217,7 @@ def load_value(element, nametable=None):
         if isdict(tag): return load_dict(child, nametable)
         if islist(tag): return load_list(child, nametable)
 
-    value = record()
+    value = {}
     for child in children:
         name, item = load_elem(child, nametable)
         # If we have seen this name before, promote the value to a list
@@ -177,7 +229,7 @@ def load_value(element, nametable=None):
         else:
             value[name] = item
 
-    return value
+    return record(value)
 
 # A generic utility that enables "dot" access to dicts
 class Record(dict):
@@ -197,7 +249,15 @@ class Record(dict):
     with the keys ``baz`` and ``qux``. If a key contains multiple ``.``, each 
     one is placed into a nested dictionary, so you can write ``r.bar.qux`` or 
     ``r['bar.qux']`` interchangeably.
+
+    Keys are looked up by ``dict`` itself. Only a missing key falls through to
+    the prefix lookup, which builds the nested record of a prefix on first use
+    and keeps it, so that later lookups of the prefix are a dictionary lookup.
+    Kept records are dropped when the record is changed, they are shared by
+    all lookups of their prefix and should not be changed themselves.
     """
+    __slots__ = ('_views',)
+
     sep = '.'
 
     def __call__(self, *args):
@@ -216,15 +276,30 @@ class Record(dict):
     def __setattr__(self, name, value):
         self[name] = value
 
+    def __reduce__(self):
+        return Record, (dict(self),)
+
     @staticmethod
     def fromkv(k, v):
         result = record()
         result[k] = v
         return result
 
-    def __getitem__(self, key):
-        if key in self:
-            return dict.__getitem__(self, key)
+    def __missing__(self, key):
+        views = _get_views(self)
+        if views is None:
+            views = {}
+            _set_views(self, views)
+        try:
+            result = views[key]
+        except KeyError:
+            result = views[key] = self._view(key)
+        if result is None:
+            raise KeyError("No key or prefix: %s" % (key + self.sep))
+        return result
+
+    def _view(self, key):
+        # Returns the nested record of the keys starting with key, or None.
         key += self.sep
         result = record()
         for k,v in self.iteritems():
@@ -238,13 +313,52 @@ class Record(dict):
                     if x not in z:
                         z[x] = record()
                     z = z[x]
-                z[ks[-1]] = v
+                dict.__setitem__(z, ks[-1], v)
             else:
-                result[suffix] = v
+                dict.__setitem__(result, suffix, v)
         if len(result) == 0:
-            raise KeyError("No key or prefix: %s" % key)
+            return None
         return result
-    
+
+    # Changes drop the nested records kept by __missing__.
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        _set_views(self, None)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        _set_views(self, None)
+
+    def clear(self):
+        dict.clear(self)
+        _set_views(self, None)
+
+    def pop(self, *args):
+        _set_views(self, None)
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        _set_views(self, None)
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        _set_views(self, None)
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        _set_views(self, None)
+
+
+def _get_views(value, _get=Record._views.__get__):
+    try:
+        return _get(value)
+    except AttributeError:
+        return None
+
+_set_views = Record._views.__set__
+
 
 def record(value=None): 
     """This function returns a :class:`Record` instance constructed with an 
@@ -30,6 +30,15 @@ as follows:::
     for item in reader:
         print(item)
     print "Results are a preview: %s" % reader.is_preview
+
+Streams requested with ``output_mode=json`` or ``output_mode=csv`` are read
+with :class:`JSONResultsReader` or :class:`CSVResultsReader`. They parse
+the stream incrementally, present the same interface, and can also return
+results in batches:::
+
+    reader = JSONResultsReader(service.jobs.export("search *", output_mode="json"))
+    for batch in reader.batches(1000):
+        ...
 """
 
 try:
@@ -47,8 +56,14 @@ try:
 except:
     from StringIO import StringIO
 
+import csv
+import json
+import re
+
 __all__ = [
     "ResultsReader",
+    "JSONResultsReader",
+    "CSVResultsReader",
     "Message"
 ]
 
@@ -95,15 +110,41 @@ class _ConcatenatedStream(object):
 
         If *n* is ``None``, return all available characters.
         """
-        response = ""
+        chunks = []
         while len(self.streams) > 0 and (n is None or n > 0):
             txt = self.streams[0].read(n)
-            response += txt
+            if n is None or txt == "":
+                del self.streams[0]
             if n is not None:
                 n -= len(txt)
-            if n > 0 or n is None:
+            chunks.append(txt)
+        return "".join(chunks)
+
+    def readinto(self, b):
+        """Read at most ``len(b)`` characters into the writable buffer *b*.
+
+        Streams that implement ``readinto`` fill *b* directly. Others are
+        read and copied once.
+
+        :return: The number of characters read, zero at end of stream.
+        """
+        view = memoryview(b)
+        size = len(view)
+        count = 0
+        while len(self.streams) > 0 and count < size:
+            stream = self.streams[0]
+            readinto = getattr(stream, 'readinto', None)
+            if readinto is not None:
+                n = readinto(view[count:])
+            else:
+                txt = stream.read(size - count)
+                n = len(txt)
+                view[count:count + n] = txt
+            if not n:
                 del self.streams[0]
-        return response
+            else:
+                count += n
+        return count
 
 class _XMLDTDFilter(object):
     """Lazily remove all XML DTDs from a stream.
@@ -112,41 +153,91 @@ class _XMLDTDFilter(object):
     removed in their entirety from the stream. No regular expressions
     are used, however, so everything still streams properly.
 
+    The underlying stream is read in blocks of *block_size* characters
+    which are scanned for ``<?`` with ``str.find``. A declaration that
+    spans two blocks is tracked across the boundary.
+
     **Example**::
 
         from StringIO import StringIO
         s = _XMLDTDFilter("<?xml abcd><element><?xml ...></element>")
         assert s.read() == "<element></element>"
     """
-    def __init__(self, stream):
+    def __init__(self, stream, block_size=65536):
         self.stream = stream
+        self.block_size = block_size
+        self._buffer = ""     # Filtered characters, consumed from _offset on
+        self._offset = 0
+        self._pending = ""    # Trailing "<" run whose successor is in the next block
+        self._in_dtd = False  # Inside a "<?...>" declaration
+        self._eof = False
 
     def read(self, n=None):
         """Read at most *n* characters from this stream.
 
         If *n* is ``None``, return all available characters.
         """
-        response = ""
-        while n is None or n > 0:
-            c = self.stream.read(1)
-            if c == "":
+        while not self._eof and (n is None or len(self._buffer) - self._offset < n):
+            self._fill()
+        if n is None:
+            response = self._buffer[self._offset:]
+        else:
+            response = self._buffer[self._offset:self._offset + n]
+        self._offset += len(response)
+        return response
+
+    def _fill(self):
+        block = self.stream.read(self.block_size)
+        if block == "":
+            self._eof = True
+            self._append([self._pending])
+            self._pending = ""
+            return
+        text = self._pending + block
+        self._pending = ""
+        end = len(text)
+        find = text.find
+        out = []
+        i = 0
+        while i < end:
+            if self._in_dtd:
+                j = find(">", i)
+                if j < 0:
+                    break
+                self._in_dtd = False
+                i = j + 1
+                continue
+            j = find("<?", i)
+            if j < 0:
+                # Hold back trailing "<" characters; they pair with the first
+                # character of the next block.
+                k = end
+                while k > i and text[k - 1] == "<":
+                    k -= 1
+                out.append(text[i:k])
+                self._pending = text[k:]
                 break
-            elif c == "<":
-                c += self.stream.read(1)
-                if c == "<?":
-                    while True:
-                        q = self.stream.read(1)
-                        if q == ">":
-                            break
-                else:
-                    response += c
-                    if n is not None:
-                        n -= len(c)
+            # Like the character-at-a-time filter this replaces, "<" consumes
+            # the character that follows it. In a run of "<" characters ending
+            # in "<?" the "?" opens a declaration only if the run is odd.
+            k = j
+            while k > i and text[k - 1] == "<":
+                k -= 1
+            if (j - k) % 2 == 0:
+                out.append(text[i:j])
+                self._in_dtd = True
             else:
-                response += c
-                if n is not None:
-                    n -= 1
-        return response
+                out.append(text[i:j + 2])
+            i = j + 2
+        self._append(out)
+
+    def _append(self, out):
+        if self._offset > 0:
+            out.insert(0, self._buffer[self._offset:])
+            self._offset = 0
+        elif self._buffer:
+            out.insert(0, self._buffer)
+        self._buffer = "".join(out)
 
 class ResultsReader(object):
     """This class returns dictionaries and Splunk messages from an XML results
@@ -268,3 +359,159 @@ class ResultsReader(object):
 
 
 
+
+
+class _IncrementalResultsReader(object):
+    """Base class for readers that parse a results stream incrementally.
+
+    Derived classes implement ``_parse_results`` as a generator over the
+    stream, which is read in blocks of *block_size* characters.
+    """
+    def __init__(self, stream, block_size=65536):
+        self.is_preview = None
+        self._gen = self._parse_results(self._blocks(stream, block_size))
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self._gen.next()
+
+    def batches(self, size=1000):
+        """Returns an iterator over lists of up to *size* results and
+        messages, in stream order."""
+        batch = []
+        for item in self._gen:
+            batch.append(item)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+    @staticmethod
+    def _blocks(stream, block_size):
+        while True:
+            block = stream.read(block_size)
+            if block == "":
+                return
+            yield block
+
+    def _parse_results(self, blocks):
+        raise NotImplementedError()
+
+
+class JSONResultsReader(_IncrementalResultsReader):
+    """This class returns dictionaries and Splunk messages from a JSON results
+    stream.
+
+    It reads both the line-oriented stream of the ``search/jobs/export``
+    endpoint and the single document returned by ``results`` and
+    ``results_preview``. Each top-level JSON value is decoded as soon as it
+    is complete, with the C scanner of the :mod:`json` module when the
+    interpreter provides it. Keys and values are returned as UTF-8 encoded
+    ``str``, and multivalue fields as lists, as by :class:`ResultsReader`.
+
+    :param `stream`: The stream to read from (any object that supports
+        ``.read()``).
+
+    **Example**::
+
+        import results
+        reader = results.JSONResultsReader(service.jobs.export("search * | head 5", output_mode="json"))
+        for result in reader:
+            if isinstance(result, dict):
+                print "Result: %s" % result
+            elif isinstance(result, results.Message):
+                print "Message: %s" % result
+    """
+    def _parse_results(self, blocks):
+        raw_decode = json.JSONDecoder().raw_decode
+        skip = JSONResultsReader._whitespace_re.match
+        buf = ""
+        retry_at = 0
+        for block in blocks:
+            buf += block
+            if len(buf) < retry_at:
+                # A document too large for the buffer is retried only after
+                # the buffer has doubled so that decoding stays linear.
+                continue
+            pos = skip(buf).end()
+            while pos < len(buf):
+                try:
+                    value, end = raw_decode(buf, pos)
+                except ValueError:
+                    break
+                for item in self._items(value):
+                    yield item
+                pos = skip(buf, end).end()
+            buf = buf[pos:]
+            retry_at = 2 * len(buf)
+        pos = skip(buf).end()
+        if pos < len(buf):
+            value, end = raw_decode(buf, pos)
+            for item in self._items(value):
+                yield item
+
+    def _items(self, value):
+        if 'preview' in value:
+            self.is_preview = bool(value['preview'])
+        for message in value.get('messages', ()):
+            yield Message(message['type'].encode('utf8'), message['text'].encode('utf8'))
+        if 'result' in value:
+            yield JSONResultsReader._result(value['result'])
+        for result in value.get('results', ()):
+            yield JSONResultsReader._result(result)
+
+    @staticmethod
+    def _result(result):
+        record = {}
+        for name, value in result.iteritems():
+            if isinstance(value, list):
+                value = [v.encode('utf8') if isinstance(v, unicode) else v for v in value]
+            elif isinstance(value, unicode):
+                value = value.encode('utf8')
+            record[name.encode('utf8')] = value
+        return record
+
+    _whitespace_re = re.compile(r'\s*')
+
+
+class CSVResultsReader(_IncrementalResultsReader):
+    """This class returns dictionaries from a CSV results stream.
+
+    Rows are parsed with the :mod:`csv` module as lines arrive. A CSV stream
+    carries neither messages nor a preview flag, so ``is_preview`` remains
+    ``None``. Splunk writes multivalue fields as newline-separated text which
+    is returned as is.
+
+    :param `stream`: The stream to read from (any object that supports
+        ``.read()``).
+
+    **Example**::
+
+        import results
+        reader = results.CSVResultsReader(service.jobs.export("search * | head 5", output_mode="csv"))
+        for batch in reader.batches(500):
+            print "%d results" % len(batch)
+    """
+    def _parse_results(self, blocks):
+        reader = csv.reader(CSVResultsReader._lines(blocks))
+        try:
+            fieldnames = reader.next()
+        except StopIteration:
+            return
+        for row in reader:
+            if len(row) > 0:
+                yield dict(zip(fieldnames, row))
+
+    @staticmethod
+    def _lines(blocks):
+        pending = ""
+        for block in blocks:
+            lines = (pending + block).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        if pending:
+            yield pending
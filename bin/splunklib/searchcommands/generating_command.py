@@ -14,6 +14,8 @@
 
 from __future__ import absolute_import
 
+from itertools import islice
+
 from . search_command import SearchCommand
 
 
@@ -67,6 +69,8 @@ class GeneratingCommand(SearchCommand):
     """
     #region Methods
 
+    _generator = None
+
     def generate(self):
         """ A generator that yields records to the Splunk processing pipeline
 
@@ -80,6 +84,18 @@ class GeneratingCommand(SearchCommand):
             writer.writerow(record)
         return
 
+    def _execute_chunk(self, operation, reader, writer, finished):
+        # The generator is kept across chunks and each chunk receives up to
+        # maxresultrows records. Splunk asks for more until we are finished.
+        if self._generator is None:
+            self._generator = operation()
+        maxresultrows = self._searchinfo.get('maxresultrows') or 50000
+        count = 0
+        for record in islice(self._generator, maxresultrows):
+            writer.writerow(record)
+            count += 1
+        return count < maxresultrows
+
     def _prepare(self, argv, input_file):
         ConfigurationSettings = type(self).ConfigurationSettings
         argv = argv[2:]
@@ -54,6 +54,8 @@ class ReportingCommand(SearchCommand):
     """
     #region Methods
 
+    _reduce_records = None
+
     def map(self, records):
         """ Override this method to compute partial results.
 
@@ -76,6 +78,22 @@ class ReportingCommand(SearchCommand):
             writer.writerow(record)
         return
 
+    def _execute_chunk(self, operation, reader, writer, finished):
+        if operation == self.map:
+            return super(ReportingCommand, self)._execute_chunk(operation, reader, writer, finished)
+        # The reduce operation must see all records. They are accumulated
+        # until Splunk sends the final chunk.
+        if self._reduce_records is None:
+            self._reduce_records = []
+        self._reduce_records.extend(SearchCommand.records(reader))
+        if finished:
+            self._execute(operation, self._reduce_records, writer)
+            self._reduce_records = None
+        return finished
+
+    def _chunked_type(self, operation):
+        return 'streaming' if operation == self.map else 'reporting'
+
     def _prepare(self, argv, input_file):
         if len(argv) >= 3 and argv[2] == '__map__':
             ConfigurationSettings = type(self).map.ConfigurationSettings
@@ -16,7 +16,7 @@ from __future__ import absolute_import
 
 # Absolute imports
 
-from splunklib.client import Service
+from cStringIO import StringIO
 
 try:
     from collections import OrderedDict  # python 2.7
@@ -35,7 +35,8 @@ from xml.etree import ElementTree
 from . import logging, splunk_csv
 from .decorators import Option
 from .validators import Boolean, Fieldname
-from .search_command_internals import InputHeader, MessagesHeader, SearchCommandParser
+from .search_command_internals import ChunkedProtocol, InputHeader, MessagesHeader, OutputBuffer, \
+    SearchCommandParser
 
 
 class SearchCommand(object):
@@ -65,8 +66,12 @@ class SearchCommand(object):
         self._configuration = None
         self._fieldnames = None
         self._option_view = None
+        self._output_fieldnames = None
         self._output_file = None
+        self._protocol = None
+        self._record_writer = None
         self._search_results_info = None
+        self._searchinfo = None
         self._service = None
 
         self.parser = SearchCommandParser()
@@ -79,6 +84,16 @@ class SearchCommand(object):
         text = ' '.join([value for value in values if len(value) > 0])
         return text
 
+    #region Class variables
+
+    # Bytes of output held back before they are written to the output file
+    output_buffer_size = 1048576
+
+    # Seconds after which pending output is written regardless of its size
+    output_flush_interval = 1.0
+
+    #endregion
+
     #region Options
 
     @Option
@@ -156,6 +171,23 @@ class SearchCommand(object):
     def fieldnames(self, value):
         self._fieldnames = value
 
+    @property
+    def output_fieldnames(self):
+        """ Returns the output fieldnames declared by this command or None.
+
+        Set this property before the first record is written to fix the output
+        schema up front. Fields that appear only in later records are then
+        represented, even when they are first seen after the output header is
+        written. When unset, the output schema is discovered from a bounded
+        look-ahead window of records. See :class:`splunk_csv.DictWriter`.
+
+        """
+        return self._output_fieldnames
+
+    @output_fieldnames.setter
+    def output_fieldnames(self, value):
+        self._output_fieldnames = value
+
     @property
     def options(self):
         """ Returns the options specified as argument to this command.
@@ -165,6 +197,17 @@ class SearchCommand(object):
             self._option_view = Option.View(self)
         return self._option_view
 
+    @property
+    def protocol_version(self):
+        """ Returns the version of the search command protocol in use: 1 for
+        the legacy protocol or 2 for the chunked protocol.
+
+        Under the legacy protocol messages are written once, ahead of the first
+        record. Under the chunked protocol they travel with every chunk.
+
+        """
+        return 1 if self._protocol is None else 2
+
     @property
     def search_results_info(self):
         """ Returns the search results info for this command invocation or None.
@@ -258,6 +301,16 @@ class SearchCommand(object):
         if self._service is not None:
             return self._service
 
+        # Imported here, most invocations never need splunklib.client
+        from splunklib.client import Service
+
+        if self._searchinfo is not None:
+            splunkd = urlsplit(self._searchinfo['splunkd_uri'], allow_fragments=False)
+            self._service = Service(
+                scheme=splunkd.scheme, host=splunkd.hostname, port=splunkd.port,
+                token=self._searchinfo['session_key'], app=self._searchinfo['app'])
+            return self._service
+
         info = self.search_results_info
 
         if info is None:
@@ -277,11 +330,24 @@ class SearchCommand(object):
     def error_exit(self, error):
         self.logger.error('Abnormal exit: ' + error)
         self.write_error(error)
+        self._write_final_chunk()
         exit(1)
 
     def process(self, args=argv, input_file=stdin, output_file=stdout):
         """ Processes search results as specified by command arguments.
 
+        Output is held in an :class:`OutputBuffer` and written to
+        :code:`output_file` in blocks of up to :code:`output_buffer_size` bytes
+        or every :code:`output_flush_interval` seconds, whichever comes first.
+        The interval is checked as each record is written, rows the CSV writer
+        holds for batching included. Pending output is flushed on exit.
+
+        Splunk uses the legacy protocol, one process per :code:`__GETINFO__`
+        and :code:`__EXECUTE__` request, when it passes arguments on the command
+        line. It uses the chunked protocol, one process per search, when it
+        passes no arguments. The chunked protocol is selected by setting
+        :code:`chunked = true` in commands.conf.
+
         :param args: Sequence of command arguments
         :param input_file: Pipeline input file
         :param output_file: Pipeline output file
@@ -289,16 +355,22 @@ class SearchCommand(object):
         """
         self.logger.debug(u'%s arguments: %s', type(self).__name__, args)
         self._configuration = None
-        self._output_file = output_file
+        self._output_file = OutputBuffer(output_file, self.output_buffer_size, self.output_flush_interval)
+        output_file = self._output_file
 
         try:
-            if len(args) >= 2 and args[1] == '__GETINFO__':
+            if len(args) == 1:
+
+                self._process_protocol_v2(args, input_file, output_file)
+
+            elif len(args) >= 2 and args[1] == '__GETINFO__':
 
                 ConfigurationSettings, operation, args, reader = self._prepare(args, input_file=None)
                 self.parser.parse(args, self)
                 self._configuration = ConfigurationSettings(self)
                 writer = splunk_csv.DictWriter(output_file, self, self.configuration.keys(), mv_delimiter=',')
                 writer.writerow(self.configuration.items())
+                writer.close()
 
             elif len(args) >= 2 and args[1] == '__EXECUTE__':
 
@@ -312,8 +384,15 @@ class SearchCommand(object):
                         'info_message', '%s command configuration settings: %s'
                         % (self.name, self._configuration))
 
-                writer = splunk_csv.DictWriter(output_file, self)
-                self._execute(operation, reader, writer)
+                writer = splunk_csv.DictWriter(output_file, self, flush_interval=self.output_flush_interval)
+                self._record_writer = writer
+                try:
+                    self._execute(operation, reader, writer)
+                except:
+                    # Records written before the error go out, the messages header is left to the error message
+                    writer.flush()
+                    raise
+                writer.close()
 
             else:
 
@@ -350,9 +429,13 @@ class SearchCommand(object):
             lineno = origin.tb_lineno
 
             self.write_error('%s at "%s", line %d : %s', error_type.__name__, filename, lineno, error_message)
+            self._write_final_chunk()
 
             exit(1)
 
+        finally:
+            output_file.flush()
+
         return
 
     @staticmethod
@@ -381,13 +464,107 @@ class SearchCommand(object):
     def _execute(self, operation, reader, writer):
         raise NotImplementedError(u'SearchCommand._configure(self, argv)')
 
+    def _execute_chunk(self, operation, reader, writer, finished):
+        """ Processes one chunk of search results under the chunked protocol.
+
+        Search commands that stream, process each chunk independently. Others
+        must override this method.
+
+        :return: :const:`True`, if this command has no more output.
+
+        """
+        self._execute(operation, reader, writer)
+        return finished
+
+    def _chunked_type(self, operation):
+        """ Returns the command type reported to Splunk under the chunked
+        protocol: :code:`streaming`, :code:`stateful`, :code:`events`, or
+        :code:`reporting`.
+
+        """
+        return 'stateful' if self._configuration.local else 'streaming'
+
+    def _process_protocol_v2(self, args, input_file, output_file):
+
+        self._protocol = ChunkedProtocol(input_file, output_file)
+        chunk = self._protocol.read()
+
+        if chunk is None:
+            return
+
+        metadata, body = chunk
+
+        if metadata.get('action') != 'getinfo':
+            raise RuntimeError('Expected getinfo action, not %s' % metadata.get('action'))
+
+        self._searchinfo = metadata['searchinfo']
+
+        if self._searchinfo.get('dispatch_dir'):
+            self.input_header._update('infoPath', path.join(self._searchinfo['dispatch_dir'], 'info.csv'))
+
+        ConfigurationSettings, operation, args, reader = self._prepare(
+            args[:1] + ['__EXECUTE__'] + self._searchinfo['args'], input_file=None)
+        self.parser.parse(args, self)
+        self._configuration = ConfigurationSettings(self)
+
+        if self.show_configuration:
+            self.messages.append(
+                'info_message', '%s command configuration settings: %s'
+                % (self.name, self._configuration))
+
+        metadata = {'type': self._chunked_type(operation), 'generating': self._configuration.generating}
+        required_fields = self._configuration.required_fields
+        if len(required_fields) > 0:
+            metadata['required_fields'] = required_fields.split(',')
+        streaming_preop = getattr(self._configuration, 'streaming_preop', '')
+        if len(streaming_preop) > 0:
+            metadata['streaming_preop'] = streaming_preop
+        self._write_chunk(metadata)
+
+        finished = False
+
+        while not finished:
+            chunk = self._protocol.read()
+            if chunk is None:
+                break
+            metadata, body = chunk
+            if metadata.get('action') != 'execute':
+                raise RuntimeError('Expected execute action, not %s' % metadata.get('action'))
+            reader = splunk_csv.DictReader(StringIO(body)) if len(body) > 0 else []
+            output = StringIO()
+            writer = splunk_csv.DictWriter(output, self, write_messages=False)
+            finished = self._execute_chunk(operation, reader, writer, metadata.get('finished', False))
+            writer.close()
+            self._write_chunk({'finished': finished}, output.getvalue())
+
+        return
+
+    def _write_chunk(self, metadata, body=''):
+        if len(self.messages) > 0:
+            metadata['inspector'] = {'messages': self.messages.inspector_messages()}
+            self.messages.clear()
+        self._protocol.write(metadata, body)
+
     def _prepare(self, argv, input_file):
         raise NotImplementedError(u'SearchCommand._configure(self, argv)')
 
+    def _write_final_chunk(self):
+        # Under the chunked protocol a command exiting on an error replies with
+        # its messages and reports that it is finished.
+        if self._protocol is not None:
+            self._write_chunk({'finished': True})
+
     def _write_message(self, message_type, message_text, *args):
         import csv
         if len(args) > 0:
             message_text = message_text % args
+        if self._protocol is not None:
+            # Sent with the next reply, Splunk reads any chunk as the reply to its last request
+            self.messages.append(message_type.lower() + '_message', message_text)
+            return
+        if self._record_writer is not None:
+            # Records held back by the writer precede the message, as they were written before it
+            self._record_writer.flush()
         writer = csv.writer(self._output_file)
         writer.writerows([[], [message_type], [message_text]])
 
@@ -17,8 +17,81 @@ try:
 except ImportError:
     from ordereddict import OrderedDict  # Python 2.6
 
+from time import time
+import json
 import re
-import urllib2 as urllib
+from urlparse import unquote
+
+
+class ChunkedProtocol(object):
+    """ Reads and writes the chunks of the chunked (version 2) search command
+    protocol.
+
+    Each chunk is a transport header followed by a JSON metadata object and a
+    body of splunk_csv search results::
+
+        chunked 1.0,<metadata-length>,<body-length>\n<metadata><body>
+
+    Splunk opens a single command process per search and exchanges chunks with
+    it until the command reports that it is finished or the input is closed.
+
+    References:
+    + [Custom search command protocol](http://dev.splunk.com/view/python-sdk/SP-CAAAEU2)
+
+    """
+    def __init__(self, input_file, output_file):
+        self._input_file = input_file
+        self._output_file = output_file
+
+    def read(self):
+        """ Reads the next chunk from the input file.
+
+        :return: Tuple of the chunk metadata and body or :const:`None`, if the
+            input file is at end-of-file.
+
+        """
+        header = self._input_file.readline()
+
+        while header == '\n':
+            header = self._input_file.readline()  # tolerate blank lines between chunks
+
+        if len(header) == 0:
+            return None
+
+        match = ChunkedProtocol._header_re.match(header)
+
+        if match is None:
+            raise RuntimeError('Malformed chunk header: %s' % repr(header))
+
+        metadata_length, body_length = int(match.group(1)), int(match.group(2))
+        metadata = self._read(metadata_length)
+        body = self._read(body_length)
+
+        try:
+            metadata = json.loads(metadata) if metadata_length > 0 else {}
+        except ValueError:
+            raise RuntimeError('Malformed chunk metadata: %s' % repr(metadata))
+
+        return metadata, body
+
+    def write(self, metadata, body=''):
+        """ Writes a chunk to the output file and flushes it so that Splunk
+        receives it immediately.
+
+        """
+        metadata = json.dumps(metadata, separators=(',', ':'))
+        self._output_file.write('chunked 1.0,%d,%d\n' % (len(metadata), len(body)))
+        self._output_file.write(metadata)
+        self._output_file.write(body)
+        self._output_file.flush()
+
+    def _read(self, length):
+        data = self._input_file.read(length)
+        if len(data) != length:
+            raise RuntimeError('Unexpected end of chunk: expected %d bytes, read %d' % (length, len(data)))
+        return data
+
+    _header_re = re.compile(r'chunked\s+1.0\s*,\s*(\d+)\s*,\s*(\d+)\s*\n$')
 
 
 class ConfigurationSettingsType(type):
@@ -128,10 +201,10 @@ class InputHeader(object):
             if len(item) == 2:
                 # start of a new item
                 self._update(key, value)
-                key, value = item[0], urllib.unquote(item[1])
+                key, value = item[0], unquote(item[1])
             elif key is not None:
                 # continuation of the current item
-                value = '\n'.join([value, urllib.unquote(line)])
+                value = '\n'.join([value, unquote(line)])
 
         self._update(key, value)
         return
@@ -198,10 +271,61 @@ class MessagesHeader(object):
             output_file.write('%s=%s\r\n' % (message_level, message_text))
         output_file.write('\r\n')
 
+    def clear(self):
+        """ Removes all messages from this MessagesHeader """
+        del self._messages[:]
+
+    def inspector_messages(self):
+        """ Returns the messages in this MessagesHeader in the form expected by
+        the :code:`inspector` element of chunked protocol metadata.
+
+        """
+        return [[message_level[:-len('_message')].upper(), message_text]
+                for message_level, message_text in self]
+
     _message_levels = [
         'debug_message', 'warn_message', 'info_message', 'error_message']
 
 
+class OutputBuffer(object):
+    """ Buffers output and writes it to an output file in large blocks.
+
+    Data is passed on when more than `size` bytes are pending or when more than
+    `interval` seconds have passed since the last flush so that Splunk can
+    preview partial results. A `size` of zero passes every write through.
+
+    """
+    def __init__(self, output_file, size, interval):
+        self._output_file = output_file
+        self._size = size
+        self._interval = interval
+        self._buffer = []
+        self._length = 0
+        self._last_flush = time()
+
+    def __getattr__(self, name):
+        return getattr(self._output_file, name)
+
+    def flush(self):
+        """ Writes all pending data to the output file and flushes it. """
+        if self._length > 0:
+            self._output_file.write(''.join(self._buffer))
+            del self._buffer[:]
+            self._length = 0
+        self._output_file.flush()
+        self._last_flush = time()
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._length += len(data)
+        if self._length >= self._size or time() - self._last_flush >= self._interval:
+            self.flush()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+
 class SearchCommandParser(object):
     """ Parses the arguments to a search command.
 
@@ -31,7 +31,7 @@ class DictReader(csv.DictReader, object):
             try:
                 self._fieldnames = self.reader.next()
             except StopIteration:
-                pass
+                self._fieldnames = []
             self.line_num = self.reader.line_num
             self.__mv_fieldnames = []
             self.__fieldnames = []
@@ -44,14 +44,19 @@ class DictReader(csv.DictReader, object):
         return self.__fieldnames
 
     def next(self):
-        row = super(DictReader, self).next()
         self.fieldnames  # for side effects
+        values = self.reader.next()
+        while values == []:
+            values = self.reader.next()
+        self.line_num = self.reader.line_num
+        # Rows are keyed by all fieldnames, including the `__mv_` fieldnames
+        # which `self.fieldnames` hides
+        row = dict(zip(self._fieldnames, values))
         for fieldname, mv_fieldname in self.__mv_fieldnames:
             # Decode, store and then delete all `__mv_` fields in `row`
-            list_value = DictReader._decode_list(row[mv_fieldname])
+            list_value = DictReader._decode_list(row.pop(mv_fieldname, ''))
             if list_value is not None:
-                row[fieldname] = list_value if len(list_value) > 1 else list[0]
-            del row[mv_fieldname]
+                row[fieldname] = list_value if len(list_value) > 1 else list_value[0]
         return row
 
     @staticmethod
@@ -15,19 +15,74 @@
 from __future__ import absolute_import
 
 from numbers import Number
+from time import time
 import csv
 
 
 class DictWriter(csv.DictWriter, object):
-    """ Splunk multi-value-aware CSV dictionary writer. """
+    """ Splunk multi-value-aware CSV dictionary writer.
 
-    def __init__(self, f, command, fieldnames=None, mv_delimiter='\n'):
+    Rows are encoded by a row encoder that is compiled once per schema and are
+    written to the underlying :code:`csv.writer` in batches of
+    :code:`batch_size` rows. Call :meth:`flush` to write pending rows.
+
+    The schema is fixed when the header is written. It is the union of the
+    fieldnames declared by the command in :code:`output_fieldnames`, if any,
+    and the keys of the records seen up to that point. Unless the command
+    declares its fieldnames, the header is held back until :code:`lookahead`
+    records have been seen. Fields that first appear after the header is
+    written cannot be represented and are reported as a warning.
+
+    The command's messages header precedes the CSV header unless
+    :code:`write_messages` is :const:`False`, as it is under the chunked
+    protocol where messages travel in chunk metadata.
+
+    When :code:`flush_interval` is set, pending rows and look-ahead records
+    are written and the output file is flushed once that many seconds have
+    passed since the last such flush, so that Splunk can preview the results
+    of commands that produce records slowly.
+
+    """
+
+    batch_size = 1000
+    lookahead = 1000
+
+    def __init__(self, f, command, fieldnames=None, mv_delimiter='\n', batch_size=None, lookahead=None,
+                 write_messages=True, flush_interval=None):
         super(DictWriter, self).__init__(
             f, fieldnames, dialect='splunklib.searchcommands')
         self._command = command
         self._fieldnames = None
         self._mv_delimiter = mv_delimiter
         self._output_file = f
+        self._batch_size = DictWriter.batch_size if batch_size is None else batch_size
+        self._lookahead = DictWriter.lookahead if lookahead is None else lookahead
+        self._lookahead_records = []
+        self._encode_row = None
+        self._known_fieldnames = None
+        self._rows = []
+        self._write_messages = write_messages
+        self._flush_interval = flush_interval
+        self._last_flush = time()
+
+    def close(self):
+        """ Writes pending rows and ensures the messages header is written,
+        even when there were no records to write.
+
+        """
+        self.flush()
+        if not self._header_written():
+            if self._write_messages:
+                self._command.messages.write(self._output_file)
+            self._fieldnames = []
+
+    def flush(self):
+        """ Writes pending rows to the output file. """
+        if len(self._lookahead_records) > 0:
+            self._write_lookahead_records()
+        if len(self._rows) > 0:
+            self.writer.writerows(self._rows)
+            del self._rows[:]
 
     def writeheader(self):
 
@@ -35,25 +90,61 @@ class DictWriter(csv.DictWriter, object):
             return
 
         _fieldnames = self.fieldnames + ['__mv_' + fn for fn in self.fieldnames]
-        save_fieldnames = self.fieldnames
-        self.fieldnames = _fieldnames
-
-        try:
+        if self._write_messages:
             self._command.messages.write(self._output_file)
-            self.writer.writerow(_fieldnames)
-        finally:
-            self.fieldnames = save_fieldnames
-
+        self.writer.writerow(_fieldnames)
         self._fieldnames = _fieldnames
+        self._encode_row = self._compile_encoder(self.fieldnames)
 
     def writerow(self, record):
-        self._writeheader(record)
-        self._writerow(record)
+        if self._encode_row is None:
+            self._lookahead_records.append(record)
+            if len(self._lookahead_records) >= self._lookahead or self._declared_fieldnames() is not None:
+                self._write_lookahead_records()
+        else:
+            if not self._known_fieldnames.issuperset(record):
+                self._drop_fieldnames(record)
+            self._rows.append(self._encode_row(record))
+            if len(self._rows) >= self._batch_size:
+                self.flush()
+        if self._flush_interval is not None and time() - self._last_flush >= self._flush_interval:
+            self.flush()
+            self._output_file.flush()
+            self._last_flush = time()
 
     def writerows(self, records):
-        self._writeheader(records[0])
         for record in records:
-            self._writerow(record)
+            self.writerow(record)
+
+    def _compile_encoder(self, fieldnames):
+        """ Returns a function that converts a record to a list of cell values
+        ordered by :code:`fieldnames` and followed by their :code:`__mv_` cells.
+
+        Records whose values are all plain strings, numbers, or :const:`None`
+        take a fast path that is free of per-field Python code. Other records
+        fall back to per-field encoding of lists and booleans.
+
+        """
+        fieldnames = tuple(fieldnames)
+        count = len(fieldnames)
+        no_multi_values = [None] * count
+        scalar_types = DictWriter._scalar_types
+        encode_list = self._encode_list
+
+        def encode_row(record):
+            values = map(record.get, fieldnames)
+            if set(map(type, values)) <= scalar_types:
+                return values + no_multi_values
+            multi_values = [None] * count
+            for i in xrange(count):
+                value = values[i]
+                if isinstance(value, list):
+                    values[i], multi_values[i] = encode_list(value)
+                elif isinstance(value, bool):
+                    values[i] = int(value)
+            return values + multi_values
+
+        return encode_row
 
     def _encode_list(self, value):
         if len(value) == 0:
@@ -79,35 +170,34 @@ class DictWriter(csv.DictWriter, object):
             return str(item)
         return repr(item)
 
-    def _writeheader(self, record):
-        if self.fieldnames is None:
-            self.fieldnames = record.keys()
+    def _declared_fieldnames(self):
+        if self.fieldnames is not None:
+            return self.fieldnames
+        return getattr(self._command, 'output_fieldnames', None)
+
+    def _drop_fieldnames(self, record):
+        dropped = [name for name in record if name not in self._known_fieldnames]
+        self._known_fieldnames.update(dropped)
+        self._command.logger.warning(
+            'Fields first seen after the output header was written are dropped: %s. Consider declaring them in '
+            'output_fieldnames.', ', '.join(dropped))
+
+    def _write_lookahead_records(self):
+        records = self._lookahead_records
+        self._lookahead_records = []
+        declared = self._declared_fieldnames()
+        fieldnames = [] if declared is None else list(declared)
+        seen = set(fieldnames)
+        for record in records:
+            for name in record:
+                if name not in seen:
+                    seen.add(name)
+                    fieldnames.append(name)
+        self.fieldnames = fieldnames
+        self._known_fieldnames = seen
         self.writeheader()
+        self._rows.extend([self._encode_row(record) for record in records])
+        if len(self._rows) >= self._batch_size:
+            self.flush()
 
-    def _writerow(self, record):
-        row = {}
-
-        for fieldname in self.fieldnames:
-            try:
-                value = record[fieldname]
-                if isinstance(value, list):
-                    value, multi_value = self._encode_list(value)
-                    row[fieldname] = value
-                    if multi_value is not None:
-                        row['__mv_' + fieldname] = multi_value
-                elif isinstance(value, bool):
-                    row[fieldname] = int(value)
-                else:
-                    row[fieldname] = value
-            except KeyError:
-                row[fieldname] = ''
-
-        save_fieldnames = self.fieldnames
-        self.fieldnames = self._fieldnames
-
-        try:
-            result = super(DictWriter, self).writerow(row)
-        finally:
-            self.fieldnames = save_fieldnames
-
-        return result
+    _scalar_types = frozenset([str, unicode, int, long, float, type(None)])
@@ -256,3 +256,6 @@ class Set(Validator):
             if value not in self.membership:
                 raise ValueError('Unrecognized value: %s' % value)
         return value
+
+    def format(self, value):
+        return self.__call__(value)
@@ -0,0 +1,169 @@
+# encoding: utf-8
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Replays recorded search command protocol transcripts through SearchCommand.process and compares the output byte for
+byte with the recorded reply.
+
+tests/data/<command>.<protocol>.input holds what splunkd writes to the command, tests/data/<command>.<protocol>.output
+what the command is expected to write back. Chunked transcripts are a getinfo chunk followed by execute chunks, legacy
+transcripts an InputHeader and CSV for __EXECUTE__, empty for __GETINFO__.
+
+Usage: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+from cStringIO import StringIO
+
+TESTS = os.path.dirname(os.path.realpath(__file__))
+DATA = os.path.join(TESTS, 'data')
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS), 'bin'))
+# SearchCommand warns, through a logger not yet set up, when run outside of Splunk
+os.environ.setdefault('SPLUNK_HOME', TESTS)
+
+from splunklib.searchcommands import Configuration, Option, validators, GeneratingCommand, ReportingCommand, \
+    StreamingCommand
+
+
+@Configuration()
+class CountCommand(GeneratingCommand):
+    """
+    Generates count records, with a multi-value field, for transcripts, warning before record warn_at and exiting on
+    an error before record fail_at
+    """
+    count = Option(require=True, validate=validators.Integer(0))
+    warn_at = Option(validate=validators.Integer(0))
+    fail_at = Option(validate=validators.Integer(0))
+
+    def generate(self):
+        for n in xrange(self.count):
+            if n == self.warn_at:
+                self.write_warning('record %d', n)
+            if n == self.fail_at:
+                self.error_exit('record %d' % n)
+            yield {'_serial': n, 'n': n, 'letters': ['a', 'b'][:n % 3]}
+
+
+@Configuration()
+class ScaleCommand(StreamingCommand):
+    """
+    Multiplies the named fields of each record by factor
+    """
+    factor = Option(require=True, validate=validators.Integer())
+
+    def stream(self, records):
+        for record in records:
+            for name in self.fieldnames:
+                record[name] = int(record[name]) * self.factor
+            yield record
+
+
+@Configuration()
+class SumCommand(ReportingCommand):
+    """
+    Sums the named fields, map yields partial sums of the same fields
+    """
+
+    @Configuration()
+    def map(self, records):
+        totals = dict.fromkeys(self.fieldnames, 0)
+        for record in records:
+            for name in self.fieldnames:
+                totals[name] += int(record[name])
+        yield totals
+
+    def reduce(self, records):
+        totals = dict.fromkeys(self.fieldnames, 0)
+        for record in records:
+            for name in self.fieldnames:
+                totals[name] += int(record[name])
+        yield totals
+
+
+def transcript(name):
+    """
+    Returns the recorded input and expected output of a transcript
+    :param name: <command>.<protocol>[.<phase>]
+    :type name: str
+    :return: tuple
+    """
+    with open(os.path.join(DATA, name + '.output'), 'rb') as f:
+        expected = f.read()
+    path = os.path.join(DATA, name + '.input')
+    if not os.path.exists(path):
+        return '', expected
+    with open(path, 'rb') as f:
+        return f.read(), expected
+
+
+# Chunk metadata and records are dicts, the recorded key order is that of python 2 without hash randomization
+@unittest.skipIf(sys.flags.hash_randomization, 'transcripts are recorded without hash randomization')
+class TestProtocol(unittest.TestCase):
+
+    def process(self, command_class, args, name):
+        """
+        Runs a command over the input of a transcript and asserts that it writes exactly the recorded output
+        :param command_class: search command class
+        :type command_class: type
+        :param args: command line, the script name alone selects the chunked protocol
+        :type args: list
+        :param name: transcript name
+        :type name: str
+        :return: None
+        """
+        input_data, expected = transcript(name)
+        output = StringIO()
+        command_class().process(args, StringIO(input_data), output)
+        self.assertEqual(expected, output.getvalue())
+
+    def test_generating_chunked(self):
+        self.process(CountCommand, ['count.py'], 'generating.chunked')
+
+    def test_generating_warning_chunked(self):
+        # the warning travels with the reply to the execute chunk it was written in
+        self.process(CountCommand, ['count.py'], 'generating.warning.chunked')
+
+    def test_generating_legacy(self):
+        self.process(CountCommand, ['count.py', '__GETINFO__', 'count=5'], 'generating.legacy.getinfo')
+        self.process(CountCommand, ['count.py', '__EXECUTE__', 'count=5'], 'generating.legacy.execute')
+
+    def test_generating_error_legacy(self):
+        # records written before the error go out, the messages header is written once, by the error message
+        for fail_at in 0, 2:
+            input_data, expected = transcript('generating.legacy.error.%d' % fail_at)
+            output = StringIO()
+            with self.assertRaises(SystemExit):
+                CountCommand().process(
+                    ['count.py', '__EXECUTE__', 'count=5', 'fail_at=%d' % fail_at], StringIO(input_data), output)
+            self.assertEqual(expected, output.getvalue())
+
+    def test_streaming_chunked(self):
+        self.process(ScaleCommand, ['scale.py'], 'streaming.chunked')
+
+    def test_streaming_legacy(self):
+        self.process(ScaleCommand, ['scale.py', '__GETINFO__', 'factor=2', 'size'], 'streaming.legacy.getinfo')
+        self.process(ScaleCommand, ['scale.py', '__EXECUTE__', 'factor=2', 'size'], 'streaming.legacy')
+
+    def test_reporting_chunked(self):
+        self.process(SumCommand, ['sum.py'], 'reporting.chunked')
+
+    def test_reporting_legacy(self):
+        self.process(SumCommand, ['sum.py', '__GETINFO__', 'size'], 'reporting.legacy.getinfo')
+        self.process(SumCommand, ['sum.py', '__EXECUTE__', '__map__', 'size'], 'reporting.legacy.map')
+        self.process(SumCommand, ['sum.py', '__EXECUTE__', 'size'], 'reporting.legacy')
+
+
+if __name__ == '__main__':
+    unittest.main()